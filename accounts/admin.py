@@ -1,5 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
+from django.utils import timezone
+from django.utils.translation import ngettext
 
 from .models import LoginAttempt, ShopUser
 
@@ -13,6 +15,17 @@ dj_admin.site.index_title = "Dashboard"
 dj_admin.site.site_url = "/"
 
 
+def _is_changelist_view(request) -> bool:
+    # Column trimming only applies to plain changelist renders; change forms and
+    # admin actions still need the full row.
+    resolver_match = getattr(request, "resolver_match", None)
+    return (
+        request.method == "GET"
+        and resolver_match is not None
+        and (resolver_match.url_name or "").endswith("_changelist")
+    )
+
+
 @admin.register(ShopUser)
 class ShopUserAdmin(UserAdmin):
     model = ShopUser
@@ -40,6 +53,7 @@ class ShopUserAdmin(UserAdmin):
         "created_at",
     )
     search_fields = ("username", "name", "contact_phone", "contact_email")
+    list_select_related = ()
     ordering = ("username",)
     readonly_fields = ("created_at", "shop_code", "totp_secret")
     actions = [
@@ -115,44 +129,47 @@ class ShopUserAdmin(UserAdmin):
     )
 
     def _update_users(self, request, queryset, **updates):
-        updated = 0
-        for user in queryset:
-            for field, value in updates.items():
-                setattr(user, field, value)
-            user.save(update_fields=list(updates.keys()))
-            updated += 1
-        return updated
+        return queryset.update(**updates, updated_at=timezone.now())
 
     def activate_users(self, request, queryset):
         updated = self._update_users(
             request,
             queryset,
             status=ShopUser.Status.ACTIVE,
+            must_change_password=False,
+            is_active=True,
         )
-        self.message_user(request, f"Activated {updated} shop(s).")
+        self.message_user(request, ngettext("Activated %d shop.", "Activated %d shops.", updated) % updated)
 
     activate_users.short_description = "Mark selected shops active"
 
     def suspend_users(self, request, queryset):
-        updated = self._update_users(request, queryset, status=ShopUser.Status.SUSPENDED)
-        self.message_user(request, f"Suspended {updated} shop(s).")
+        updated = self._update_users(
+            request,
+            queryset,
+            status=ShopUser.Status.SUSPENDED,
+            is_active=False,
+        )
+        self.message_user(request, ngettext("Suspended %d shop.", "Suspended %d shops.", updated) % updated)
 
     suspend_users.short_description = "Suspend selected shops"
 
     def mark_profiles_complete(self, request, queryset):
         updated = self._update_users(request, queryset, profile_completed=True)
-        self.message_user(request, f"Marked {updated} profile(s) complete.")
+        self.message_user(request, ngettext("Marked %d profile complete.", "Marked %d profiles complete.", updated) % updated)
 
     mark_profiles_complete.short_description = "Mark profile completed"
 
     def reset_two_factor(self, request, queryset):
-        updated = 0
-        for user in queryset:
-            user.two_factor_enabled = False
-            user.totp_secret = ""
-            user.save(update_fields=["two_factor_enabled", "totp_secret"])
-            updated += 1
-        self.message_user(request, f"Reset 2FA for {updated} shop(s).")
+        updated = self._update_users(
+            request,
+            queryset,
+            two_factor_enabled=False,
+            totp_secret="",
+            two_factor_totp_enabled=False,
+            two_factor_email_enabled=False,
+        )
+        self.message_user(request, ngettext("Reset 2FA for %d shop.", "Reset 2FA for %d shops.", updated) % updated)
 
     reset_two_factor.short_description = "Disable 2FA and clear secret"
 
@@ -167,13 +184,34 @@ class ShopUserAdmin(UserAdmin):
                 user.status = ShopUser.Status.ACTIVE
             user.save(update_fields=["role", "is_staff", "status"])
             updated += 1
-        self.message_user(request, f"Promoted {updated} user(s) to manager.")
+        self.message_user(request, ngettext("Promoted %d user to manager.", "Promoted %d users to manager.", updated) % updated)
 
     promote_to_manager.short_description = "Promote selected users to manager"
 
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if _is_changelist_view(request):
+            queryset = queryset.only(*self.list_display, "id", "password", "last_login", "is_active")
+        return queryset
+
 
 @admin.register(LoginAttempt)
 class LoginAttemptAdmin(admin.ModelAdmin):
     list_display = ("username", "success", "ip_address", "timestamp")
     search_fields = ("username", "ip_address")
     list_filter = ("success", "timestamp")
+    list_select_related = ("user",)
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request).select_related("user")
+        if _is_changelist_view(request):
+            queryset = queryset.only(
+                "id",
+                "username",
+                "success",
+                "ip_address",
+                "timestamp",
+                "user_id",
+                "user__username",
+            )
+        return queryset
@@ -127,7 +127,11 @@ class AdminManagerListCreateView(APIView):
     )
     def get(self, request):
         search = (request.query_params.get("search") or "").strip()
-        managers = ShopUser.objects.filter(role=ShopUser.Role.MANAGER).order_by("-created_at")
+        managers = (
+            ShopUser.objects.filter(role=ShopUser.Role.MANAGER)
+            .only(*ShopUserSerializer.queryset_fields())
+            .order_by("-created_at")
+        )
 
         if search:
             managers = managers.filter(
@@ -252,11 +256,15 @@ class AdminManagerDetailView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        active_managers = ShopUser.objects.filter(
-            role=ShopUser.Role.MANAGER,
-            status=ShopUser.Status.ACTIVE,
-        ).count()
-        if manager.status == ShopUser.Status.ACTIVE and active_managers <= 1:
+        if (
+            manager.status == ShopUser.Status.ACTIVE
+            and not ShopUser.objects.filter(
+                role=ShopUser.Role.MANAGER,
+                status=ShopUser.Status.ACTIVE,
+            )
+            .exclude(pk=manager.pk)
+            .exists()
+        ):
             return Response(
                 {"detail": "At least one active manager must remain."},
                 status=status.HTTP_400_BAD_REQUEST,
@@ -295,7 +303,11 @@ class AdminShopListCreateView(APIView):
         search = (request.query_params.get("search") or "").strip()
         status_filter = (request.query_params.get("status") or "").strip().lower()
 
-        shops = ShopUser.objects.filter(role=ShopUser.Role.SHOP).order_by("-created_at")
+        shops = (
+            ShopUser.objects.filter(role=ShopUser.Role.SHOP)
+            .only(*ShopUserSerializer.queryset_fields())
+            .order_by("-created_at")
+        )
 
         if status_filter:
             shops = shops.filter(status=status_filter)
@@ -0,0 +1,24 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+
+class ShopTokenAuthentication(TokenAuthentication):
+    """Token authentication that loads the token and its user in one query.
+
+    Every authenticated endpoint reads ``request.user``, so the user row must
+    come from the same JOIN as the token. This pins that contract here rather
+    than relying on DRF's default implementation staying the same.
+    """
+
+    def authenticate_credentials(self, key):
+        model = self.get_model()
+        try:
+            token = model.objects.select_related("user").get(key=key)
+        except model.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_("Invalid token."))
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_("User inactive or deleted."))
+
+        return (token.user, token)
@@ -1,30 +1,147 @@
+import atexit
+import heapq
+import itertools
 import logging
+import queue
 import threading
+import time
+from functools import lru_cache
 
 from django.conf import settings
-from django.core.mail import EmailMultiAlternatives
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.dispatch import receiver
 from django.utils.html import escape
 
 
 logger = logging.getLogger(__name__)
 
+# Same entity mapping as django.utils.html.escape, applied in a single pass.
+_HTML_ESCAPES = {
+    "&": "&amp;",
+    "<": "&lt;",
+    ">": "&gt;",
+    '"': "&quot;",
+    "'": "&#x27;",
+}
+_HTML_ESCAPE_TABLE = str.maketrans(_HTML_ESCAPES)
+_HTML_ESCAPE_NL_TABLE = str.maketrans({**_HTML_ESCAPES, "\n": "<br>"})
 
+_HTML_BODY_OPEN = """</div>
+        </div>
+        <div style=\"padding:24px;\">
+          <h2 style=\"margin:0 0 12px;color:#0f172a;font-size:20px;\">"""
+
+_HTML_MESSAGE_OPEN = """</h2>
+          <p style=\"margin:0;color:#334155;line-height:1.65;font-size:15px;\">"""
+
+
+def _escape_html(value: str) -> str:
+    return str(value).translate(_HTML_ESCAPE_TABLE)
+
+
+def _escape_html_nl(value: str) -> str:
+    return str(value).translate(_HTML_ESCAPE_NL_TABLE)
+
+
+# Settings are read once per process; ``_reset_email_settings`` clears the
+# caches whenever a test overrides one of them.
+@lru_cache(maxsize=1)
 def _resolve_from_email() -> str:
     return getattr(settings, "DEFAULT_FROM_EMAIL", "noreply@lulubingo.com")
 
 
+@lru_cache(maxsize=1)
+def _brand_constants() -> tuple[str, str]:
+    return (
+        getattr(settings, "BRAND_NAME", "LULU Bingo"),
+        getattr(settings, "BRAND_LOGO_URL", ""),
+    )
+
+
+@lru_cache(maxsize=1)
 def _should_raise_email_errors() -> bool:
     return bool(getattr(settings, "EMAIL_RAISE_EXCEPTIONS", False))
 
 
+@lru_cache(maxsize=1)
 def _should_send_async() -> bool:
     return bool(getattr(settings, "EMAIL_SEND_ASYNC", False))
 
 
+@lru_cache(maxsize=1)
 def _should_fail_silently() -> bool:
     return bool(getattr(settings, "EMAIL_FAIL_SILENTLY", False))
 
 
+@lru_cache(maxsize=1)
+def _branded_shell() -> tuple[str, str, str]:
+    """Build the settings-derived parts of the branded HTML layout once.
+
+    Returns ``(from_email, html_prefix, html_suffix)``; the prefix stops right
+    before the banner label and the suffix starts after the CTA block.
+    """
+    from_email = _resolve_from_email()
+    brand_name, brand_logo_url = _brand_constants()
+
+    logo_html = ""
+    if brand_logo_url:
+        logo_html = (
+            f'<img src="{escape(brand_logo_url)}" alt="{escape(brand_name)} logo" '
+            'style="height:40px;width:auto;display:block;margin-bottom:10px;" />'
+        )
+
+    html_prefix = f"""
+    <div style=\"margin:0;padding:0;background:#f8fafc;font-family:Inter,Segoe UI,Arial,sans-serif;\">
+      <div style=\"max-width:640px;margin:24px auto;background:#ffffff;border:1px solid #e2e8f0;border-radius:16px;overflow:hidden;\">
+        <div style=\"background:linear-gradient(135deg,#b91c1c,#7f1d1d);padding:20px 24px;color:#fff;\">
+          {logo_html}
+          <div style=\"font-size:22px;font-weight:800;letter-spacing:0.3px;\">{escape(brand_name)}</div>
+              <div style=\"font-size:13px;opacity:0.9;margin-top:4px;\">"""
+
+    html_suffix = f"""
+          <hr style=\"border:none;border-top:1px solid #e2e8f0;margin:20px 0 16px;\" />
+          <p style=\"margin:0;color:#475569;font-size:12px;line-height:1.6;\">
+            Sent by {escape(brand_name)} - From: {escape(from_email)}
+          </p>
+          <p style=\"margin:24px 0 0;color:#64748b;font-size:12px;line-height:1.5;\">
+            This mailbox is not monitored. Please do not reply to this email.
+          </p>
+        </div>
+      </div>
+    </div>
+    """
+    return from_email, html_prefix, html_suffix
+
+
+_CACHED_EMAIL_SETTINGS = frozenset(
+    {
+        "DEFAULT_FROM_EMAIL",
+        "BRAND_NAME",
+        "BRAND_LOGO_URL",
+        "EMAIL_RAISE_EXCEPTIONS",
+        "EMAIL_SEND_ASYNC",
+        "EMAIL_FAIL_SILENTLY",
+    }
+)
+
+
+@receiver(setting_changed)
+def _reset_email_settings(*, setting, **kwargs):
+    if setting not in _CACHED_EMAIL_SETTINGS:
+        return
+    for cached in (
+        _resolve_from_email,
+        _brand_constants,
+        _should_raise_email_errors,
+        _should_send_async,
+        _should_fail_silently,
+        _branded_shell,
+    ):
+        cached.cache_clear()
+
+
 def _deliver_email(
     email: EmailMultiAlternatives,
     to_email: str,
@@ -46,6 +163,100 @@ def _deliver_email(
         return False
 
 
+# Async mail goes through one sender thread that owns retries and backoff,
+# so an SMTP outage fills a bounded queue instead of parking a sleeping
+# thread per message.
+_EMAIL_QUEUE_SIZE = 500
+_email_queue: queue.Queue = queue.Queue(maxsize=_EMAIL_QUEUE_SIZE)
+# (due monotonic time, tie-breaker, email, recipient, retries left)
+_email_retries: list[tuple[float, int, EmailMultiAlternatives, str, int]] = []
+_email_retries_lock = threading.Lock()
+_email_retry_order = itertools.count()
+_email_sender: threading.Thread | None = None
+_email_sender_lock = threading.Lock()
+
+
+def _queue_email(email: EmailMultiAlternatives, to_email: str) -> None:
+    try:
+        _email_queue.put_nowait((email, to_email))
+    except queue.Full:
+        logger.warning("Email queue full; dropping email to %s", to_email)
+        return
+    _ensure_email_sender()
+
+
+def _ensure_email_sender() -> None:
+    global _email_sender
+    with _email_sender_lock:
+        if _email_sender is None or not _email_sender.is_alive():
+            _email_sender = threading.Thread(target=_email_sender_loop, daemon=True, name="lulubingo-email")
+            _email_sender.start()
+
+
+def _schedule_email_retry(email: EmailMultiAlternatives, to_email: str, retries_left: int) -> None:
+    if retries_left <= 0:
+        logger.warning("Giving up on email to %s", to_email)
+        return
+    delay = float(getattr(settings, "EMAIL_ASYNC_RETRY_DELAY", 30))
+    with _email_retries_lock:
+        if len(_email_retries) >= _EMAIL_QUEUE_SIZE:
+            logger.warning("Email retry backlog full; dropping email to %s", to_email)
+            return
+        heapq.heappush(
+            _email_retries,
+            (time.monotonic() + delay, next(_email_retry_order), email, to_email, retries_left - 1),
+        )
+
+
+def _process_email_queue(timeout: float | None) -> bool:
+    """Deliver one due retry or queued email; False when nothing arrived in ``timeout``."""
+    with _email_retries_lock:
+        if _email_retries and _email_retries[0][0] <= time.monotonic():
+            _, _, email, to_email, retries_left = heapq.heappop(_email_retries)
+        else:
+            email = None
+            if _email_retries:
+                due_in = max(_email_retries[0][0] - time.monotonic(), 0)
+                timeout = due_in if timeout is None else min(timeout, due_in)
+
+    if email is None:
+        try:
+            email, to_email = _email_queue.get(timeout=timeout)
+        except queue.Empty:
+            return False
+        retries_left = max(int(getattr(settings, "EMAIL_ASYNC_MAX_RETRIES", 3)), 0)
+
+    if not _deliver_email(email, to_email, raise_errors=False):
+        _schedule_email_retry(email, to_email, retries_left)
+    return True
+
+
+def _email_sender_loop() -> None:
+    while True:
+        try:
+            _process_email_queue(None)
+        except Exception:
+            logger.exception("Background email sender failed")
+
+
+def _flush_email_queue_at_exit() -> None:
+    # Give queued and retrying mail one last immediate attempt on shutdown.
+    with _email_retries_lock:
+        pending = [(email, to_email) for _, _, email, to_email, _ in _email_retries]
+        _email_retries.clear()
+    while True:
+        try:
+            pending.append(_email_queue.get_nowait())
+        except queue.Empty:
+            break
+    for email, to_email in pending:
+        if not _deliver_email(email, to_email, raise_errors=False):
+            logger.warning("Dropping undelivered email to %s at shutdown", to_email)
+
+
+atexit.register(_flush_email_queue_at_exit)
+
+
 def send_branded_email(
     to_email: str,
     subject: str,
@@ -54,6 +265,7 @@ def send_branded_email(
     cta_text: str | None = None,
     cta_url: str | None = None,
     banner_text: str | None = None,
+    batch: list[EmailMultiAlternatives] | None = None,
 ) -> bool:
     if not to_email:
         return False
@@ -61,52 +273,33 @@ def send_branded_email(
     raise_errors = _should_raise_email_errors()
     send_async = _should_send_async() and not raise_errors
 
-    from_email = _resolve_from_email()
-    brand_name = getattr(settings, "BRAND_NAME", "LULU Bingo")
-    brand_logo_url = getattr(settings, "BRAND_LOGO_URL", "")
+    from_email, html_prefix, html_suffix = _branded_shell()
     banner_label = (banner_text or "Security Notification").strip() or "Security Notification"
-    safe_heading = escape(heading)
-    safe_message = escape(message).replace("\n", "<br>")
-
-    logo_html = ""
-    if brand_logo_url:
-        logo_html = (
-            f'<img src="{escape(brand_logo_url)}" alt="{escape(brand_name)} logo" '
-            'style="height:40px;width:auto;display:block;margin-bottom:10px;" />'
-        )
+    safe_heading = _escape_html(heading)
+    safe_message = _escape_html_nl(message)
 
     cta_html = ""
     if cta_text and cta_url:
         cta_html = (
             '<div style="margin:24px 0 8px;">'
-            f'<a href="{escape(cta_url)}" '
+            f'<a href="{_escape_html(cta_url)}" '
             'style="display:inline-block;padding:12px 18px;background:#b91c1c;color:#fff;text-decoration:none;border-radius:10px;font-weight:700;">'
-            f"{escape(cta_text)}</a></div>"
+            f"{_escape_html(cta_text)}</a></div>"
         )
 
-    html_body = f"""
-    <div style=\"margin:0;padding:0;background:#f8fafc;font-family:Inter,Segoe UI,Arial,sans-serif;\">
-      <div style=\"max-width:640px;margin:24px auto;background:#ffffff;border:1px solid #e2e8f0;border-radius:16px;overflow:hidden;\">
-        <div style=\"background:linear-gradient(135deg,#b91c1c,#7f1d1d);padding:20px 24px;color:#fff;\">
-          {logo_html}
-          <div style=\"font-size:22px;font-weight:800;letter-spacing:0.3px;\">{escape(brand_name)}</div>
-              <div style=\"font-size:13px;opacity:0.9;margin-top:4px;\">{escape(banner_label)}</div>
-        </div>
-        <div style=\"padding:24px;\">
-          <h2 style=\"margin:0 0 12px;color:#0f172a;font-size:20px;\">{safe_heading}</h2>
-          <p style=\"margin:0;color:#334155;line-height:1.65;font-size:15px;\">{safe_message}</p>
-          {cta_html}
-          <hr style=\"border:none;border-top:1px solid #e2e8f0;margin:20px 0 16px;\" />
-          <p style=\"margin:0;color:#475569;font-size:12px;line-height:1.6;\">
-            Sent by {escape(brand_name)} - From: {escape(from_email)}
-          </p>
-          <p style=\"margin:24px 0 0;color:#64748b;font-size:12px;line-height:1.5;\">
-            This mailbox is not monitored. Please do not reply to this email.
-          </p>
-        </div>
-      </div>
-    </div>
-    """
+    html_body = "".join(
+        (
+            html_prefix,
+            _escape_html(banner_label),
+            _HTML_BODY_OPEN,
+            safe_heading,
+            _HTML_MESSAGE_OPEN,
+            safe_message,
+            "</p>\n          ",
+            cta_html,
+            html_suffix,
+        )
+    )
 
     plain_body = (
         f"{heading}\n\n{message}\n\n"
@@ -121,15 +314,48 @@ def send_branded_email(
     )
     email.attach_alternative(html_body, "text/html")
 
+    if batch is not None:
+        # Deferred: the caller delivers the whole batch via flush_branded_emails.
+        batch.append(email)
+        return True
+
     if send_async:
+        # Queue only once the caller's writes (e.g. a freshly saved 2FA code)
+        # are committed; outside a transaction this runs now.
+        transaction.on_commit(lambda: _queue_email(email, to_email))
+        return True
+
+    return _deliver_email(email, to_email, raise_errors=raise_errors)
+
+
+def _deliver_batch(batch: list[EmailMultiAlternatives], *, raise_errors: bool) -> int:
+    try:
+        connection = get_connection(fail_silently=_should_fail_silently())
+        return connection.send_messages(batch) or 0
+    except Exception as exc:
+        logger.warning("Batched email delivery skipped for %d message(s): %s", len(batch), exc)
+        if raise_errors:
+            raise
+        return 0
+
+
+def flush_branded_emails(batch: list[EmailMultiAlternatives]) -> int:
+    """Deliver emails queued with ``send_branded_email(batch=...)`` over one connection."""
+    messages = list(batch)
+    batch.clear()
+    if not messages:
+        return 0
+
+    raise_errors = _should_raise_email_errors()
+    if _should_send_async() and not raise_errors:
         worker = threading.Thread(
-            target=_deliver_email,
-            args=(email, to_email),
+            target=_deliver_batch,
+            args=(messages,),
             kwargs={"raise_errors": False},
             daemon=True,
-            name="lulubingo-email",
+            name="lulubingo-email-batch",
         )
-        worker.start()
-        return True
+        transaction.on_commit(worker.start)
+        return len(messages)
 
-    return _deliver_email(email, to_email, raise_errors=raise_errors)
+    return _deliver_batch(messages, raise_errors=raise_errors)
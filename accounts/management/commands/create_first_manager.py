@@ -64,8 +64,7 @@ class Command(BaseCommand):
             return first
 
     def handle(self, *args, **options):
-        existing = ShopUser.objects.filter(role=ShopUser.Role.MANAGER).count()
-        if existing > 0 and not options.get("force"):
+        if not options.get("force") and ShopUser.objects.filter(role=ShopUser.Role.MANAGER).exists():
             raise CommandError(
                 "A manager already exists. Use --force to create an additional manager."
             )
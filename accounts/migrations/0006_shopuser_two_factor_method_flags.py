@@ -1,44 +1,35 @@
 from django.db import migrations, models
+from django.db.models import Case, Q, Value, When
 
 
 def forwards(apps, schema_editor):
     ShopUser = apps.get_model("accounts", "ShopUser")
 
-    for user in ShopUser.objects.all().only(
-        "id",
-        "two_factor_enabled",
-        "two_factor_method",
-        "two_factor_totp_enabled",
-        "two_factor_email_enabled",
-    ):
-        if user.two_factor_enabled:
-            if user.two_factor_method == "email_code":
-                user.two_factor_email_enabled = True
-            else:
-                user.two_factor_totp_enabled = True
-            ShopUser.objects.filter(pk=user.pk).update(
-                two_factor_totp_enabled=user.two_factor_totp_enabled,
-                two_factor_email_enabled=user.two_factor_email_enabled,
-            )
+    enabled = ShopUser.objects.filter(two_factor_enabled=True)
+    enabled.filter(two_factor_method="email_code").update(two_factor_email_enabled=True)
+    enabled.exclude(two_factor_method="email_code").update(two_factor_totp_enabled=True)
 
 
 def backwards(apps, schema_editor):
     ShopUser = apps.get_model("accounts", "ShopUser")
 
-    for user in ShopUser.objects.all().only(
-        "id",
-        "two_factor_totp_enabled",
-        "two_factor_email_enabled",
-    ):
-        enabled = bool(user.two_factor_totp_enabled or user.two_factor_email_enabled)
-        method = "totp"
-        if user.two_factor_email_enabled and not user.two_factor_totp_enabled:
-            method = "email_code"
-
-        ShopUser.objects.filter(pk=user.pk).update(
-            two_factor_enabled=enabled,
-            two_factor_method=method,
-        )
+    ShopUser.objects.update(
+        two_factor_enabled=Case(
+            When(
+                Q(two_factor_totp_enabled=True) | Q(two_factor_email_enabled=True),
+                then=Value(True),
+            ),
+            default=Value(False),
+        ),
+        two_factor_method=Case(
+            When(
+                two_factor_email_enabled=True,
+                two_factor_totp_enabled=False,
+                then=Value("email_code"),
+            ),
+            default=Value("totp"),
+        ),
+    )
 
 
 class Migration(migrations.Migration):
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.9 on 2026-10-15 22:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0009_shopuser_bonus_contribution_per_cartella_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='loginattempt',
+            index=models.Index(fields=['-timestamp'], name='la_ts_desc'),
+        ),
+        migrations.AddIndex(
+            model_name='loginattempt',
+            index=models.Index(fields=['username', '-timestamp'], name='la_user_ts'),
+        ),
+        migrations.AddIndex(
+            model_name='loginattempt',
+            index=models.Index(fields=['ip_address', '-timestamp'], name='la_ip_ts'),
+        ),
+        migrations.AddIndex(
+            model_name='loginattempt',
+            index=models.Index(fields=['success', '-timestamp'], name='la_succ_ts'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.9 on 2026-10-15 23:09
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0010_loginattempt_indexes'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='shopuser',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('contact_email'), name='uniq_shopuser_email_lower'),
+        ),
+    ]
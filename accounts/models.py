@@ -1,19 +1,58 @@
-import uuid
-import random
-import string
-
+import re
+import hmac
+import secrets
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+
+from pyotp import random_base32
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, BaseUserManager
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
 from django.utils import timezone
 from django.utils.text import slugify
 
 
+_DEFAULT_SHOP_CODE_RE = re.compile(r"^shop-[0-9a-f]{8}$")
+
+_GENERATED_ID_ATTEMPTS = 5
+
+_EMAIL_2FA_TTL = timedelta(minutes=10)
+
+_DEFAULT_SHOP_CUT = Decimal("10")
+_DEFAULT_LULU_CUT = Decimal("15")
+_MIN_PERCENTAGE = Decimal("0")
+_MAX_PERCENTAGE = Decimal("100")
+
+# Columns written by the status and two-factor bookkeeping in ShopUser.save().
+_STATUS_FIELDS = frozenset({"role", "status", "is_staff", "is_active"})
+_TWO_FACTOR_FIELDS = frozenset(
+    {"two_factor_enabled", "two_factor_method", "two_factor_totp_enabled", "two_factor_email_enabled"}
+)
+
+
+def _clamp_percentage(value, default: Decimal) -> Decimal:
+    # DecimalField values are used as-is; anything else is parsed once.
+    if not isinstance(value, Decimal):
+        try:
+            value = Decimal(str(value if value is not None else default))
+        except (InvalidOperation, ValueError):
+            value = default
+    return max(_MIN_PERCENTAGE, min(_MAX_PERCENTAGE, value))
+
+
+@lru_cache(maxsize=1024)
+def _slugify_shop_name(value: str) -> str:
+    return slugify(value) or "shop"
+
+
 def generate_default_shop_code() -> str:
-    return f"shop-{uuid.uuid4().hex[:8]}"
+    return f"shop-{secrets.token_hex(4)}"
 
 
 def generate_default_human_shop_id() -> str:
-    return f"SHOP-{uuid.uuid4().hex[:6].upper()}"
+    return f"SHOP-{secrets.token_hex(3).upper()}"
 
 
 class ShopUserManager(BaseUserManager):
@@ -34,7 +73,7 @@ class ShopUserManager(BaseUserManager):
         if self.model.objects.filter(username=username).exists():
             raise ValueError("Username already exists. Please choose a different username.")
 
-        if self.model.objects.filter(contact_email__iexact=contact_email).exists():
+        if self.model.objects.alias(email_lower=Lower("contact_email")).filter(email_lower=contact_email).exists():
             raise ValueError("Contact email already exists. Use another email address.")
 
         if self.model.objects.filter(contact_phone=contact_phone).exists():
@@ -53,13 +92,59 @@ class ShopUserManager(BaseUserManager):
         else:
             extra_fields.setdefault("status", ShopUser.Status.PENDING)
         extra_fields.setdefault("feature_flags", {})
+        extra_fields["must_change_password"] = extra_fields.get("must_change_password", True)
 
         user = self.model(username=username, **extra_fields)
         user.set_password(password)
-        user.must_change_password = extra_fields.get("must_change_password", True)
-        user.save(using=self._db)
+        user.save(using=self._db, force_insert=True)
         return user
 
+    def bulk_create_shops(self, users, batch_size: int | None = None):
+        """Insert unsaved ``ShopUser`` instances in bulk.
+
+        ``bulk_create`` bypasses ``save()``, so the derived fields are resolved
+        here: one query for colliding shop codes, one per round of human id
+        candidates. Callers are expected to have set passwords already.
+        """
+        users = list(users)
+        if not users:
+            return []
+
+        pending_codes = []
+        taken_codes = set()
+        for user in users:
+            if user._needs_shop_code():
+                pending_codes.append((user, user._shop_code_base()))
+            else:
+                taken_codes.add(user.shop_code)
+        if pending_codes:
+            prefix_filter = Q()
+            for base in {base for _, base in pending_codes}:
+                prefix_filter |= Q(shop_code__startswith=base)
+            taken_codes.update(self.filter(prefix_filter).values_list("shop_code", flat=True))
+        for user, base in pending_codes:
+            user.shop_code = ShopUser._first_free_shop_code(base, taken_codes)
+            taken_codes.add(user.shop_code)
+
+        pending_ids = [user for user in users if not user.human_shop_id]
+        taken_ids = {user.human_shop_id for user in users if user.human_shop_id}
+        while pending_ids:
+            for user in pending_ids:
+                user.human_shop_id = generate_default_human_shop_id()
+            candidates = [user.human_shop_id for user in pending_ids]
+            taken_ids.update(self.filter(human_shop_id__in=candidates).values_list("human_shop_id", flat=True))
+            retry = []
+            for user in pending_ids:
+                if user.human_shop_id in taken_ids:
+                    retry.append(user)
+                else:
+                    taken_ids.add(user.human_shop_id)
+            pending_ids = retry
+
+        for user in users:
+            user._apply_business_flags()
+        return self.bulk_create(users, batch_size=batch_size)
+
     def create_superuser(self, username: str, password: str, **extra_fields):
         extra_fields.setdefault("is_staff", True)
         extra_fields.setdefault("is_superuser", True)
@@ -68,11 +153,11 @@ class ShopUserManager(BaseUserManager):
         extra_fields.setdefault("must_change_password", False)
         extra_fields.setdefault(
             "contact_email",
-            f"admin-{uuid.uuid4().hex[:10]}@lulu-bingo.local",
+            f"admin-{secrets.token_hex(5)}@lulu-bingo.local",
         )
         extra_fields.setdefault(
             "contact_phone",
-            f"9{''.join(random.choices(string.digits, k=9))}",
+            f"9{secrets.randbelow(10**9):09d}",
         )
 
         if extra_fields.get("is_staff") is not True:
@@ -144,49 +229,79 @@ class ShopUser(AbstractBaseUser, PermissionsMixin):
     is_active = models.BooleanField(default=False)
     is_staff = models.BooleanField(default=False)
     created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
 
     objects = ShopUserManager()
 
     USERNAME_FIELD = "username"
     REQUIRED_FIELDS: list[str] = ["contact_email", "contact_phone"]
 
+    class Meta:
+        constraints = [
+            # Backs case-insensitive email lookups, which filter on
+            # Lower("contact_email") so the functional index can be used.
+            models.UniqueConstraint(Lower("contact_email"), name="uniq_shopuser_email_lower"),
+        ]
+
     def __str__(self):
         return f"{self.name} ({self.username})"
 
-    def _ensure_shop_code(self):
-        base = slugify(self.name or self.username or "shop") or "shop"
-        if self.shop_code and not (
-            self.shop_code.startswith("shop-") and len(self.shop_code) == len("shop-") + 8
-        ):
-            return
+    def cut_percentages(self) -> tuple[Decimal, Decimal]:
+        """Shop and Lulu cut percentages, clamped to 0-100."""
+        return (
+            _clamp_percentage(self.shop_cut_percentage, _DEFAULT_SHOP_CUT),
+            _clamp_percentage(self.lulu_cut_percentage, _DEFAULT_LULU_CUT),
+        )
+
+    def _needs_shop_code(self) -> bool:
+        return not self.shop_code or _DEFAULT_SHOP_CODE_RE.match(self.shop_code) is not None
 
+    def _shop_code_base(self) -> str:
+        return _slugify_shop_name(self.name or self.username or "shop")
+
+    @staticmethod
+    def _first_free_shop_code(base: str, taken: set[str]) -> str:
         candidate = base
         suffix = 1
-        while type(self).objects.filter(shop_code=candidate).exclude(pk=self.pk).exists():
+        while candidate in taken:
             suffix += 1
             candidate = f"{base}-{suffix}"
-        self.shop_code = candidate
+        return candidate
+
+    def _ensure_shop_code(self) -> bool:
+        if not self._needs_shop_code():
+            return False
 
-    def _ensure_human_shop_id(self):
+        # One lookup for every code sharing the slug prefix, then resolve the
+        # first free suffix in memory.
+        base = self._shop_code_base()
+        existing = type(self).objects.filter(shop_code__startswith=base)
+        if self.pk is not None:
+            existing = existing.exclude(pk=self.pk)
+        taken = set(existing.values_list("shop_code", flat=True))
+        self.shop_code = self._first_free_shop_code(base, taken)
+        return True
+
+    def _ensure_human_shop_id(self) -> bool:
+        # Uniqueness is enforced by the column's unique index; save() retries
+        # with a fresh id on the rare collision.
         if self.human_shop_id:
-            return
-        candidate = f"SHOP-{uuid.uuid4().hex[:6].upper()}"
-        while type(self).objects.filter(human_shop_id=candidate).exclude(pk=self.pk).exists():
-            candidate = f"SHOP-{uuid.uuid4().hex[:6].upper()}"
-        self.human_shop_id = candidate
+            return False
+        self.human_shop_id = generate_default_human_shop_id()
+        return True
 
-    def ensure_totp_secret(self):
+    def ensure_totp_secret(self) -> bool:
+        """Generate a TOTP secret if missing; returns True when one was created."""
         if self.totp_secret:
-            return
+            return False
         # 32-character base32 secret compatible with Google Authenticator
-        from pyotp import random_base32
-
         self.totp_secret = random_base32()
+        return True
 
     def generate_email_2fa_code(self) -> str:
-        code = "".join(random.choices(string.digits, k=6))
+        code = f"{secrets.randbelow(1_000_000):06d}"
         self.two_factor_email_code = code
-        self.two_factor_email_code_expires_at = timezone.now() + timezone.timedelta(minutes=10)
+        self.two_factor_email_code_expires_at = timezone.now() + _EMAIL_2FA_TTL
         return code
 
     def verify_email_2fa_code(self, code: str) -> bool:
@@ -194,7 +309,9 @@ class ShopUser(AbstractBaseUser, PermissionsMixin):
             return False
         if timezone.now() > self.two_factor_email_code_expires_at:
             return False
-        return str(code).strip() == self.two_factor_email_code
+        return hmac.compare_digest(
+            str(code).strip().encode(), self.two_factor_email_code.encode()
+        )
 
     def clear_email_2fa_code(self):
         self.two_factor_email_code = ""
@@ -209,15 +326,32 @@ class ShopUser(AbstractBaseUser, PermissionsMixin):
         return methods
 
     def sync_two_factor_status(self):
-        methods = self.get_enabled_2fa_methods()
-        self.two_factor_enabled = len(methods) > 0
-        if methods:
-            if self.two_factor_method not in methods:
-                self.two_factor_method = methods[0]
+        totp_enabled = self.two_factor_totp_enabled
+        email_enabled = self.two_factor_email_enabled
+        self.two_factor_enabled = bool(totp_enabled or email_enabled)
+        if totp_enabled and email_enabled:
+            if self.two_factor_method not in ("totp", "email_code"):
+                self.two_factor_method = "totp"
+        elif email_enabled:
+            self.two_factor_method = "email_code"
         else:
             self.two_factor_method = "totp"
 
-    def save(self, *args, **kwargs):
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_saved_state()
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._remember_saved_state()
+
+    def _remember_saved_state(self):
+        # Deferred columns stay untracked, so they always count as changed.
+        self._saved_status = self.__dict__.get("status")
+
+    def _apply_status_flags(self):
         if self.role == self.Role.MANAGER:
             self.is_staff = True
             if self.status == self.Status.PENDING:
@@ -225,10 +359,56 @@ class ShopUser(AbstractBaseUser, PermissionsMixin):
 
         # Keep Django's is_active flag aligned with the business status.
         self.is_active = self.status == self.Status.ACTIVE
+
+    def _apply_business_flags(self):
+        self._apply_status_flags()
         self.sync_two_factor_status()
-        self._ensure_shop_code()
-        self._ensure_human_shop_id()
-        super().save(*args, **kwargs)
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        touched = None if update_fields is None else frozenset(update_fields)
+        if touched and "updated_at" not in touched:
+            # Narrow saves still bump updated_at; cached /me payloads key on it.
+            kwargs["update_fields"] = [*update_fields, "updated_at"]
+
+        if touched is None or not touched.isdisjoint(_STATUS_FIELDS):
+            if (
+                self._state.adding
+                or self.role == self.Role.MANAGER
+                or self.status != getattr(self, "_saved_status", None)
+            ):
+                self._apply_status_flags()
+        if touched is None or not touched.isdisjoint(_TWO_FACTOR_FIELDS):
+            self.sync_two_factor_status()
+        generated: set[str] = set()
+        if (touched is None or "shop_code" in touched) and self._ensure_shop_code():
+            generated.add("shop_code")
+        if (touched is None or "human_shop_id" in touched) and self._ensure_human_shop_id():
+            generated.add("human_shop_id")
+
+        if not generated:
+            super().save(*args, **kwargs)
+        else:
+            self._save_with_generated_ids(generated, *args, **kwargs)
+        self._remember_saved_state()
+
+    def _save_with_generated_ids(self, generated: set[str], *args, **kwargs):
+        for attempt in range(_GENERATED_ID_ATTEMPTS):
+            try:
+                with transaction.atomic(using=kwargs.get("using")):
+                    super().save(*args, **kwargs)
+                return
+            except IntegrityError as exc:
+                # Only regenerate identifiers this save produced; any other
+                # constraint violation is the caller's problem.
+                collided = {field for field in generated if field in str(exc)}
+                if not collided or attempt == _GENERATED_ID_ATTEMPTS - 1:
+                    raise
+                if "shop_code" in collided:
+                    self.shop_code = ""
+                    self._ensure_shop_code()
+                if "human_shop_id" in collided:
+                    self.human_shop_id = generate_default_human_shop_id()
 
 
 class LoginAttempt(models.Model):
@@ -241,6 +421,12 @@ class LoginAttempt(models.Model):
 
     class Meta:
         ordering = ["-timestamp"]
+        indexes = [
+            models.Index(fields=["-timestamp"], name="la_ts_desc"),
+            models.Index(fields=["username", "-timestamp"], name="la_user_ts"),
+            models.Index(fields=["ip_address", "-timestamp"], name="la_ip_ts"),
+            models.Index(fields=["success", "-timestamp"], name="la_succ_ts"),
+        ]
 
     def __str__(self):
         status = "success" if self.success else "failure"
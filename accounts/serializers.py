@@ -1,15 +1,65 @@
-import pyotp
+import base64
+import hashlib
+import hmac
+import re
+import struct
+import time
+import unicodedata
+from functools import lru_cache
+
 from django.utils import timezone
-from django.contrib.auth import authenticate
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.tokens import default_token_generator
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django.utils.encoding import force_str
 from django.utils.http import urlsafe_base64_decode
 from rest_framework import serializers
+from rest_framework.fields import SkipField
 
 from .models import LoginAttempt, ShopUser
 from .emailing import send_branded_email
 
 
+# "<base36 timestamp>-<hex digest>" as produced by PasswordResetTokenGenerator.
+_RESET_TOKEN_RE = re.compile(r"^[0-9a-z]{1,13}-[0-9a-f]{20,40}$")
+
+
+@lru_cache(maxsize=4096)
+def _totp_hmac(secret: str) -> hmac.HMAC:
+    # Keyed HMAC-SHA1 state; copies skip the base32 decode and key schedule.
+    key = base64.b32decode(secret + "=" * (-len(secret) % 8), casefold=True)
+    return hmac.new(key, digestmod=hashlib.sha1)
+
+
+def _totp_code(keyed: hmac.HMAC, step: int) -> bytes:
+    mac = keyed.copy()
+    mac.update(struct.pack(">Q", step))
+    digest = mac.digest()
+    offset = digest[-1] & 0x0F
+    return b"%06d" % ((struct.unpack_from(">I", digest, offset)[0] & 0x7FFFFFFF) % 1_000_000)
+
+
+def _verify_totp(secret: str, otp: str, valid_window: int = 1) -> bool:
+    """Check a 6-digit RFC 6238 code, accepting +/- ``valid_window`` 30s steps.
+
+    Same result as ``pyotp.TOTP(secret).verify(otp, valid_window=1)``, but the
+    keyed HMAC state is built once per secret. The current step is tried first and
+    the loop stops at the first match; each comparison is constant-time.
+    """
+    candidate = unicodedata.normalize("NFKC", str(otp)).encode()
+    keyed = _totp_hmac(secret)
+    counter = int(time.time()) // 30
+    steps = [counter]
+    for delta in range(1, valid_window + 1):
+        steps += (counter - delta, counter + delta)
+    for step in steps:
+        if hmac.compare_digest(_totp_code(keyed, step), candidate):
+            return True
+    return False
+
+
 class ShopUserSerializer(serializers.ModelSerializer):
     two_factor_methods = serializers.SerializerMethodField()
 
@@ -56,10 +106,50 @@ class ShopUserSerializer(serializers.ModelSerializer):
             "contact_phone": {"required": True},
         }
 
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            allowed = set(fields)
+            for name in list(self.fields):
+                if name not in allowed:
+                    self.fields.pop(name)
+
+    @classmethod
+    def queryset_fields(cls, fields=None) -> list[str]:
+        """Model columns to pass to ``.only()`` when rendering ``fields``."""
+        names = cls.Meta.fields if fields is None else [name for name in cls.Meta.fields if name in fields]
+        columns = [name for name in names if name != "two_factor_methods"]
+        if "two_factor_methods" in names:
+            columns += ["two_factor_totp_enabled", "two_factor_email_enabled"]
+        return columns
+
     def get_two_factor_methods(self, obj) -> list[str]:
         return obj.get_enabled_2fa_methods()
 
 
+@lru_cache(maxsize=1)
+def _shop_user_output_fields():
+    # ModelSerializer rebuilds (and deep-copies) its fields for every
+    # instance; the bound fields are stateless for output, so build once.
+    return tuple(
+        (name, field)
+        for name, field in ShopUserSerializer().fields.items()
+        if not field.write_only
+    )
+
+
+def serialize_shop_user(user) -> dict:
+    """Same payload as ``ShopUserSerializer(user).data`` without per-call field setup."""
+    data = {}
+    for name, field in _shop_user_output_fields():
+        try:
+            attribute = field.get_attribute(user)
+        except SkipField:
+            continue
+        data[name] = None if attribute is None else field.to_representation(attribute)
+    return data
+
+
 class LoginSerializer(serializers.Serializer):
     username = serializers.CharField()
     password = serializers.CharField(write_only=True)
@@ -98,10 +188,11 @@ class LoginSerializer(serializers.Serializer):
     def _get_client_ip(request) -> str | None:
         if request is None:
             return None
-        x_forwarded_for = request.META.get("HTTP_X_FORWARDED_FOR")
+        meta = request.META
+        x_forwarded_for = meta.get("HTTP_X_FORWARDED_FOR")
         if x_forwarded_for:
-            return x_forwarded_for.split(",")[0].strip()
-        return request.META.get("REMOTE_ADDR")
+            return x_forwarded_for.partition(",")[0].strip()
+        return meta.get("REMOTE_ADDR")
 
     @staticmethod
     def _is_known_ip_for_user(user, ip_address: str | None) -> bool:
@@ -116,19 +207,21 @@ class LoginSerializer(serializers.Serializer):
     def validate(self, attrs):
         username = attrs.get("username")
         password = attrs.get("password")
-        request = self.context.get("request")
-        user = authenticate(request=request, username=username, password=password)
-        if not user:
-            try:
-                shop = ShopUser.objects.get(username=username)
-            except ShopUser.DoesNotExist:
-                raise serializers.ValidationError("Invalid credentials. Please check your username and password.")
-
-            if shop.status != ShopUser.Status.ACTIVE:
-                raise serializers.ValidationError(
-                    "Your shop is currently inactive. Please contact support for assistance."
-                )
+        # One lookup serves both the password check and the inactive-shop
+        # message, instead of authenticate() followed by a status query.
+        try:
+            user = ShopUser.objects.get(username=username)
+        except ShopUser.DoesNotExist:
+            # Hash anyway so unknown usernames take as long as wrong passwords.
+            make_password(password)
+            raise serializers.ValidationError("Invalid credentials. Please check your username and password.")
+
+        if user.status != ShopUser.Status.ACTIVE:
+            raise serializers.ValidationError(
+                "Your shop is currently inactive. Please contact support for assistance."
+            )
 
+        if not user.is_active or not user.check_password(password):
             raise serializers.ValidationError("Invalid credentials. Please check your username and password.")
 
         if user.role == ShopUser.Role.DEVELOPER:
@@ -273,10 +366,10 @@ class LoginSerializer(serializers.Serializer):
             otp_valid = False
 
             if "totp" in enabled_methods:
-                if not user.totp_secret:
+                secret = user.totp_secret
+                if not secret:
                     raise serializers.ValidationError("Two-factor is enabled but no secret is configured. Contact support.")
-                totp = pyotp.TOTP(user.totp_secret)
-                otp_valid = totp.verify(otp, valid_window=1)
+                otp_valid = _verify_totp(secret, otp)
 
             if not otp_valid and "email_code" in enabled_methods:
                 otp_valid = user.verify_email_2fa_code(otp)
@@ -320,11 +413,6 @@ class ChangePasswordSerializer(serializers.Serializer):
             raise serializers.ValidationError("Current password is incorrect.")
         return value
 
-    def validate_new_password(self, value):
-        if value.strip() == "":
-            raise serializers.ValidationError("New password cannot be blank.")
-        return value
-
     def validate(self, attrs):
         attrs = super().validate(attrs)
         user = self.context["request"].user
@@ -368,10 +456,10 @@ class ChangePasswordSerializer(serializers.Serializer):
         otp_valid = False
 
         if selected_method == "totp":
-            if not user.totp_secret:
+            secret = user.totp_secret
+            if not secret:
                 raise serializers.ValidationError({"otp": "No TOTP secret is configured. Contact support."})
-            totp = pyotp.TOTP(user.totp_secret)
-            otp_valid = totp.verify(otp, valid_window=1)
+            otp_valid = _verify_totp(secret, otp)
         elif selected_method == "email_code":
             if not user.contact_email:
                 raise serializers.ValidationError({"otp": "No contact email configured for email-code verification."})
@@ -494,23 +582,23 @@ class ShopProfileSerializer(serializers.ModelSerializer):
         contact_email = attrs.get("contact_email", getattr(instance, "contact_email", ""))
         contact_phone = attrs.get("contact_phone", getattr(instance, "contact_phone", ""))
 
+        lookup = Q()
         if contact_email:
-            duplicate_email = (
-                ShopUser.objects.filter(contact_email__iexact=contact_email)
-                .exclude(pk=getattr(instance, "pk", None))
-                .exists()
-            )
-            if duplicate_email:
-                errors["contact_email"] = "This email is already used by another shop."
-
+            lookup |= Q(email_lower=contact_email.lower())
         if contact_phone:
-            duplicate_phone = (
-                ShopUser.objects.filter(contact_phone=contact_phone)
-                .exclude(pk=getattr(instance, "pk", None))
-                .exists()
-            )
-            if duplicate_phone:
-                errors["contact_phone"] = "This phone number is already used by another shop."
+            lookup |= Q(contact_phone=contact_phone)
+        if lookup:
+            # One round-trip for both checks; matches are sorted out in Python.
+            matches = ShopUser.objects.alias(email_lower=Lower("contact_email")).filter(lookup)
+            if instance.pk is not None:
+                matches = matches.exclude(pk=instance.pk)
+            matches = matches.values_list("contact_email", "contact_phone")
+            email_key = contact_email.lower() if contact_email else None
+            for other_email, other_phone in matches:
+                if email_key and (other_email or "").lower() == email_key:
+                    errors["contact_email"] = "This email is already used by another shop."
+                if contact_phone and other_phone == contact_phone:
+                    errors["contact_phone"] = "This phone number is already used by another shop."
 
         if errors:
             raise serializers.ValidationError(errors)
@@ -527,12 +615,14 @@ class ShopProfileSerializer(serializers.ModelSerializer):
         }
 
         feature_flags_patch = validated_data.pop("feature_flags", None)
+        update_fields = list(validated_data)
         if feature_flags_patch is not None:
             existing_flags = (
                 instance.feature_flags if isinstance(instance.feature_flags, dict) else {}
             )
             if isinstance(feature_flags_patch, dict):
                 instance.feature_flags = {**existing_flags, **feature_flags_patch}
+                update_fields.append("feature_flags")
 
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
@@ -542,8 +632,10 @@ class ShopProfileSerializer(serializers.ModelSerializer):
                 bool(str(getattr(instance, field_name, "")).strip())
                 for field_name in profile_completion_fields
             )
+            update_fields.append("profile_completed")
 
-        instance.save()
+        # Only write the columns this request touched.
+        instance.save(update_fields=update_fields)
         return instance
 
 
@@ -556,10 +648,23 @@ class PasswordResetRequestSerializer(serializers.Serializer):
         email = attrs.get("contact_email")
         user = None
 
+        lookup = Q()
         if username:
-            user = ShopUser.objects.filter(username=username).first()
-        if not user and email:
-            user = ShopUser.objects.filter(contact_email=email).first()
+            lookup |= Q(username=username)
+        if email:
+            lookup |= Q(contact_email=email)
+        if lookup:
+            # Both identifiers in one query; a username match still wins over
+            # an email match on a different shop. Only the columns the reset
+            # token and email need are loaded.
+            candidates = list(
+                ShopUser.objects.filter(lookup).only(
+                    "id", "username", "password", "last_login", "contact_email"
+                )[:2]
+            )
+            user = next((c for c in candidates if username and c.username == username), None)
+            if user is None and candidates:
+                user = candidates[0]
 
         attrs["user"] = user
         return attrs
@@ -573,10 +678,14 @@ class PasswordResetConfirmSerializer(serializers.Serializer):
     def validate(self, attrs):
         uid = attrs.get("uid")
         token = attrs.get("token")
+        # Reject tokens default_token_generator could never have issued
+        # without touching the database.
+        if not _RESET_TOKEN_RE.match(token or ""):
+            raise serializers.ValidationError("Invalid or expired reset token")
         try:
             user_id = force_str(urlsafe_base64_decode(uid))
             user = ShopUser.objects.get(pk=user_id)
-        except Exception:
+        except (TypeError, ValueError, OverflowError, ShopUser.DoesNotExist, DjangoValidationError):
             raise serializers.ValidationError("Invalid reset token")
 
         if not default_token_generator.check_token(user, token):
@@ -601,10 +710,10 @@ class TwoFactorEnableSerializer(serializers.Serializer):
         otp = attrs.get("otp")
 
         if method == "totp":
-            if not user.totp_secret:
+            secret = user.totp_secret
+            if not secret:
                 raise serializers.ValidationError("No TOTP secret is set. Generate one first.")
-            totp = pyotp.TOTP(user.totp_secret)
-            if not totp.verify(otp, valid_window=1):
+            if not _verify_totp(secret, otp):
                 raise serializers.ValidationError({"otp": "Invalid or expired OTP"})
         else:
             if not user.contact_email:
@@ -640,10 +749,10 @@ class TwoFactorDisableSerializer(serializers.Serializer):
         otp = attrs.get("otp")
 
         if method == "totp":
-            if not user.totp_secret:
+            secret = user.totp_secret
+            if not secret:
                 raise serializers.ValidationError("No TOTP secret is set.")
-            totp = pyotp.TOTP(user.totp_secret)
-            if not totp.verify(otp, valid_window=1):
+            if not _verify_totp(secret, otp):
                 raise serializers.ValidationError({"otp": "Invalid or expired OTP"})
         else:
             if not user.contact_email:
@@ -660,7 +769,8 @@ class TwoFactorEmailCodeSerializer(serializers.Serializer):
     purpose = serializers.ChoiceField(choices=["enable", "disable", "change_password"])
 
     def validate(self, attrs):
-        user = self.context["request"].user
-        if not user.contact_email:
+        email = self.context["request"].user.contact_email
+        if not email:
             raise serializers.ValidationError({"detail": "Contact email is required for email-code 2FA."})
+        attrs["contact_email"] = email
         return attrs
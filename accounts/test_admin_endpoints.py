@@ -5,6 +5,7 @@ from rest_framework import status
 from rest_framework.test import APITestCase
 
 from accounts.models import ShopUser
+from accounts.serializers import ShopUserSerializer
 from transactions.models import Transaction
 
 
@@ -144,3 +145,25 @@ class AdminEndpointTests(APITestCase):
         self.assertEqual(tx.tx_type, Transaction.Type.DEPOSIT)
         self.assertEqual(tx.amount, Decimal("250.00"))
         self.assertEqual(tx.metadata.get("event"), "shop_balance_topup")
+
+    def test_shop_list_renders_full_payload_from_narrowed_queryset(self):
+        ShopUser.objects.create_user(
+            username="listed-shop",
+            password="pass12345",
+            name="Listed Shop",
+            contact_email="listed-shop@example.com",
+            contact_phone="0911555666",
+            role=ShopUser.Role.SHOP,
+            two_factor_email_enabled=True,
+        )
+        self.client.force_authenticate(self.manager)
+
+        resp = self.client.get(reverse("admin-shops"))
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(resp.data), 1)
+        self.assertEqual(set(resp.data[0]), set(ShopUserSerializer.Meta.fields))
+        self.assertEqual(resp.data[0]["two_factor_methods"], ["email_code"])
+
+    def test_shop_user_serializer_limits_rendered_fields(self):
+        data = ShopUserSerializer(self.manager, fields=("id", "username", "status")).data
+        self.assertEqual(set(data), {"id", "username", "status"})
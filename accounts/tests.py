@@ -1,7 +1,9 @@
 import pyotp
+import time
 from unittest.mock import patch
 from django.contrib.auth.tokens import default_token_generator
 from django.core import mail
+from django.core.cache import cache
 from django.test import override_settings
 from django.urls import reverse
 from django.utils.encoding import force_bytes
@@ -15,6 +17,8 @@ from .models import ShopUser, LoginAttempt
 @override_settings(EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend")
 class AuthTests(APITestCase):
     def setUp(self):
+        # Login failure counters live in the process-wide cache.
+        cache.clear()
         self.user = ShopUser.objects.create_user(
             username="shop1",
             password="pass1234",
@@ -74,6 +78,14 @@ class AuthTests(APITestCase):
         resp = self.client.post(url, {"username": "pending", "password": "temp1234"}, format="json")
         self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_login_serializer_looks_up_user_once_on_failure(self):
+        from .serializers import LoginSerializer
+
+        serializer = LoginSerializer(data={"username": "shop1", "password": "wrong"})
+        with self.assertNumQueries(1):
+            self.assertFalse(serializer.is_valid())
+        self.assertIn("Invalid credentials", str(serializer.errors))
+
     def test_change_password_requires_current_password(self):
         url = reverse("login")
         login_resp = self.client.post(url, {"username": "shop1", "password": "pass1234"}, format="json")
@@ -87,6 +99,17 @@ class AuthTests(APITestCase):
         )
         self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_change_password_rejects_whitespace_only_password(self):
+        login_resp = self.client.post(reverse("login"), {"username": "shop1", "password": "pass1234"}, format="json")
+        resp = self.client.post(
+            reverse("password-change"),
+            {"current_password": "pass1234", "new_password": "          "},
+            format="json",
+            HTTP_AUTHORIZATION=f"Token {login_resp.data['token']}",
+        )
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("new_password", resp.data)
+
     def test_change_password_rotates_token_and_clears_flag(self):
         user = ShopUser.objects.create_user(
             username="shop2",
@@ -194,6 +217,53 @@ class AuthTests(APITestCase):
         self.assertGreaterEqual(len(mail.outbox), 1)
         self.assertIn("Profile updated", mail.outbox[0].subject)
 
+    def test_profile_update_rejects_contacts_used_by_other_shops(self):
+        ShopUser.objects.create_user(
+            username="shop-other",
+            password="pass1234",
+            name="Other Shop",
+            contact_email="Other@Example.com",
+            contact_phone="+251900100050",
+        )
+        login_resp = self.client.post(reverse("login"), {"username": "shop1", "password": "pass1234"}, format="json")
+        token = login_resp.data["token"]
+
+        payload = {
+            "name": "Shop One",
+            "contact_phone": "+251900100050",
+            "contact_email": "other@example.com",
+            "bank_name": "Bank",
+            "bank_account_name": "Shop One",
+            "bank_account_number": "1234567890",
+        }
+        resp = self.client.put(reverse("shop-profile"), payload, format="json", HTTP_AUTHORIZATION=f"Token {token}")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("contact_email", resp.data)
+        self.assertIn("contact_phone", resp.data)
+
+    def test_profile_update_writes_only_submitted_columns(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        login_resp = self.client.post(reverse("login"), {"username": "shop1", "password": "pass1234"}, format="json")
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.put(
+                reverse("shop-profile"),
+                {
+                    "bank_name": "New Bank",
+                    "bank_account_name": "Shop One",
+                    "bank_account_number": "1234567890",
+                    "feature_flags": {"theme": "light"},
+                },
+                format="json",
+                HTTP_AUTHORIZATION=f"Token {login_resp.data['token']}",
+            )
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        updates = [q["sql"] for q in ctx.captured_queries if q["sql"].startswith('UPDATE "accounts_shopuser"')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"bank_name"', updates[0])
+        self.assertNotIn('"wallet_balance"', updates[0])
+
     def test_feature_flag_preferences_update_merges_without_email(self):
         login_resp = self.client.post(reverse("login"), {"username": "shop1", "password": "pass1234"}, format="json")
         token = login_resp.data["token"]
@@ -215,6 +285,33 @@ class AuthTests(APITestCase):
         self.assertEqual(resp.data["feature_flags"]["auto_call_seconds"], 5)
         self.assertEqual(len(mail.outbox), 0)
 
+    def test_reset_request_prefers_username_match_in_single_query(self):
+        other = ShopUser.objects.create_user(
+            username="shop-other",
+            password="pass1234",
+            name="Other Shop",
+            contact_email="other@example.com",
+            contact_phone="+251900100051",
+        )
+        mail.outbox.clear()
+        with self.assertNumQueries(1):
+            resp = self.client.post(
+                reverse("password-forgot"),
+                {"username": "shop1", "contact_email": other.contact_email},
+                format="json",
+            )
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["shop1@example.com"])
+
+        mail.outbox.clear()
+        self.client.post(
+            reverse("password-forgot"),
+            {"username": "missing", "contact_email": other.contact_email},
+            format="json",
+        )
+        self.assertEqual(mail.outbox[0].to, [other.contact_email])
+
     def test_reset_confirm_updates_password_and_issues_token(self):
         uid = urlsafe_base64_encode(force_bytes(self.user.pk))
         token = default_token_generator.make_token(self.user)
@@ -228,6 +325,26 @@ class AuthTests(APITestCase):
         self.user.refresh_from_db()
         self.assertTrue(self.user.check_password("brandNewPass1"))
 
+    def test_reset_confirm_rejects_malformed_token_without_lookup(self):
+        uid = urlsafe_base64_encode(force_bytes(self.user.pk))
+        with self.assertNumQueries(0):
+            resp = self.client.post(
+                reverse("password-reset"),
+                {"uid": uid, "token": "not a token", "new_password": "brandNewPass1"},
+                format="json",
+            )
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_reset_confirm_rejects_undecodable_uid(self):
+        token = default_token_generator.make_token(self.user)
+        for uid in ("***", urlsafe_base64_encode(b"not-a-pk"), urlsafe_base64_encode(b"999999")):
+            resp = self.client.post(
+                reverse("password-reset"),
+                {"uid": uid, "token": token, "new_password": "brandNewPass1"},
+                format="json",
+            )
+            self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_login_requires_otp_when_2fa_enabled(self):
         self.user.two_factor_enabled = True
         self.user.ensure_totp_secret()
@@ -508,3 +625,298 @@ class AuthTests(APITestCase):
         self.assertGreaterEqual(len(mail.outbox), 1)
         self.assertIn("Reserve deduction applied", mail.outbox[0].subject)
         self.assertIn("shop-deduct@example.com", mail.outbox[0].to)
+
+    def test_admin_bulk_actions_keep_is_active_in_sync(self):
+        from django.contrib import admin as django_admin
+
+        from .admin import ShopUserAdmin
+
+        pending = ShopUser.objects.create_user(
+            username="bulk-pending",
+            password="bulkpass123",
+            name="Bulk Pending",
+            contact_email="bulk-pending@example.com",
+            contact_phone="+251900000404",
+        )
+        self.assertFalse(pending.is_active)
+
+        model_admin = ShopUserAdmin(ShopUser, django_admin.site)
+        queryset = ShopUser.objects.filter(pk__in=[pending.pk, self.user.pk])
+        with patch.object(model_admin, "message_user"):
+            model_admin.activate_users(None, queryset)
+        pending.refresh_from_db()
+        self.assertEqual(pending.status, ShopUser.Status.ACTIVE)
+        self.assertTrue(pending.is_active)
+
+        with patch.object(model_admin, "message_user"):
+            model_admin.suspend_users(None, queryset)
+        pending.refresh_from_db()
+        self.assertEqual(pending.status, ShopUser.Status.SUSPENDED)
+        self.assertFalse(pending.is_active)
+
+    def test_bulk_create_shops_resolves_codes_without_save(self):
+        existing = ShopUser.objects.create_user(
+            username="bulk-base",
+            password="bulkpass123",
+            name="Bulk Shop",
+            contact_email="bulk-base@example.com",
+            contact_phone="+251900000500",
+        )
+        self.assertEqual(existing.shop_code, "bulk-shop")
+
+        users = []
+        for index in range(3):
+            user = ShopUser(
+                username=f"bulk-{index}",
+                name="Bulk Shop",
+                contact_email=f"bulk-{index}@example.com",
+                contact_phone=f"+25190000051{index}",
+                status=ShopUser.Status.ACTIVE,
+            )
+            user.set_password("bulkpass123")
+            users.append(user)
+
+        ShopUser.objects.bulk_create_shops(users)
+
+        created = ShopUser.objects.filter(username__startswith="bulk-").exclude(pk=existing.pk)
+        self.assertEqual(
+            sorted(created.values_list("shop_code", flat=True)),
+            ["bulk-shop-2", "bulk-shop-3", "bulk-shop-4"],
+        )
+        self.assertTrue(all(created.values_list("is_active", flat=True)))
+        self.assertEqual(len(set(created.values_list("human_shop_id", flat=True))), 3)
+
+    def test_narrow_update_fields_save_skips_derived_lookups(self):
+        user = ShopUser.objects.get(pk=self.user.pk)
+        user.wallet_balance = "75"
+        with self.assertNumQueries(1):
+            user.save(update_fields=["wallet_balance"])
+
+        user.status = ShopUser.Status.SUSPENDED
+        user.save(update_fields=["status", "is_active"])
+        user.refresh_from_db()
+        self.assertFalse(user.is_active)
+
+    def test_human_shop_id_collision_is_retried(self):
+        taken = self.user.human_shop_id
+        with patch(
+            "accounts.models.generate_default_human_shop_id",
+            side_effect=[taken, "SHOP-FRESH1"],
+        ):
+            user = ShopUser.objects.create_user(
+                username="shop-collide",
+                password="pass1234",
+                name="Collide Shop",
+                contact_email="collide@example.com",
+                contact_phone="+251900100099",
+            )
+        self.assertEqual(user.human_shop_id, "SHOP-FRESH1")
+
+    def test_verify_totp_matches_pyotp_window(self):
+        from .serializers import _verify_totp
+
+        secret = pyotp.random_base32()
+        totp = pyotp.TOTP(secret)
+        now = time.time()
+        self.assertTrue(_verify_totp(secret, totp.at(now)))
+        self.assertTrue(_verify_totp(secret, totp.at(now - 30)))
+        self.assertFalse(_verify_totp(secret, totp.at(now - 120)))
+        self.assertFalse(_verify_totp(secret, "abcdef"))
+
+    @override_settings(
+        LOGIN_ATTEMPT_BUFFER_SIZE=3,
+        LOGIN_ATTEMPT_FLUSH_SECONDS=60,
+        LOGIN_ATTEMPT_ASYNC_FLUSH=False,
+    )
+    def test_failed_login_attempts_are_buffered_and_bulk_written(self):
+        from .views import flush_login_attempts
+
+        url = reverse("login")
+        for _ in range(2):
+            self.client.post(url, {"username": "shop1", "password": "wrong"}, format="json")
+        self.assertEqual(LoginAttempt.objects.count(), 0)
+
+        self.client.post(url, {"username": "shop1", "password": "wrong"}, format="json")
+        self.assertEqual(LoginAttempt.objects.filter(success=False).count(), 3)
+
+        self.client.post(url, {"username": "shop1", "password": "wrong"}, format="json")
+        self.client.post(url, {"username": "shop1", "password": "pass1234"}, format="json")
+        self.assertEqual(LoginAttempt.objects.filter(success=True).count(), 1)
+        self.assertEqual(flush_login_attempts(), 1)
+        self.assertEqual(LoginAttempt.objects.filter(success=False).count(), 4)
+
+    @override_settings(
+        LOGIN_ATTEMPT_BUFFER_SIZE=10,
+        LOGIN_ATTEMPT_FLUSH_SECONDS=60,
+        LOGIN_ATTEMPT_ASYNC_FLUSH=False,
+    )
+    def test_failed_flush_keeps_buffered_login_attempts(self):
+        from django.db import OperationalError
+
+        from .views import flush_login_attempts
+
+        self.client.post(reverse("login"), {"username": "shop1", "password": "wrong"}, format="json")
+        with patch.object(LoginAttempt.objects, "bulk_create", side_effect=OperationalError):
+            with self.assertRaises(OperationalError):
+                flush_login_attempts()
+
+        self.assertEqual(flush_login_attempts(), 1)
+        self.assertEqual(LoginAttempt.objects.filter(success=False).count(), 1)
+
+    def test_email_code_save_does_not_touch_two_factor_flags(self):
+        user = ShopUser.objects.only(
+            "id", "two_factor_email_code", "two_factor_email_code_expires_at"
+        ).get(pk=self.user.pk)
+        user.generate_email_2fa_code()
+        with self.assertNumQueries(1):
+            user.save(update_fields=["two_factor_email_code", "two_factor_email_code_expires_at"])
+
+    def test_serialize_shop_user_matches_model_serializer(self):
+        from .serializers import ShopUserSerializer, serialize_shop_user
+
+        self.user.feature_flags = {"theme": "dark"}
+        self.user.two_factor_email_enabled = True
+        self.user.wallet_balance = "12.5"
+        self.user.save()
+        user = ShopUser.objects.get(pk=self.user.pk)
+        self.assertEqual(serialize_shop_user(user), dict(ShopUserSerializer(user).data))
+
+    def test_token_authentication_loads_user_in_same_query(self):
+        from rest_framework.authtoken.models import Token
+
+        from .authentication import ShopTokenAuthentication
+
+        token = Token.objects.create(user=self.user)
+        with self.assertNumQueries(1):
+            user, _ = ShopTokenAuthentication().authenticate_credentials(token.key)
+            self.assertEqual(user.username, "shop1")
+
+    def test_me_payload_is_cached_until_user_changes(self):
+        login_resp = self.client.post(reverse("login"), {"username": "shop1", "password": "pass1234"}, format="json")
+        headers = {"HTTP_AUTHORIZATION": f"Token {login_resp.data['token']}"}
+
+        first = self.client.get(reverse("me"), **headers)
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+
+        user = ShopUser.objects.get(pk=self.user.pk)
+        user.wallet_balance = "321.00"
+        user.save(update_fields=["wallet_balance"])
+
+        second = self.client.get(reverse("me"), **headers)
+        self.assertEqual(second.data["user"]["wallet_balance"], "321.00")
+        self.assertEqual(second["Content-Type"], "application/json")
+        self.assertEqual(second.json()["user"]["wallet_balance"], "321.00")
+
+        browsable = self.client.get(reverse("me"), HTTP_ACCEPT="text/html", **headers)
+        self.assertEqual(browsable.status_code, status.HTTP_200_OK)
+        self.assertIn("text/html", browsable["Content-Type"])
+
+    def test_profile_payload_is_cached_until_user_changes(self):
+        login_resp = self.client.post(reverse("login"), {"username": "shop1", "password": "pass1234"}, format="json")
+        headers = {"HTTP_AUTHORIZATION": f"Token {login_resp.data['token']}"}
+
+        first = self.client.get(reverse("shop-profile"), **headers)
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+
+        user = ShopUser.objects.get(pk=self.user.pk)
+        user.name = "Renamed Shop"
+        user.save(update_fields=["name"])
+
+        second = self.client.get(reverse("shop-profile"), **headers)
+        self.assertEqual(second.data["name"], "Renamed Shop")
+
+    @override_settings(EMAIL_SEND_ASYNC=True)
+    def test_async_email_waits_for_transaction_commit(self):
+        from .emailing import send_branded_email
+
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.assertTrue(
+                send_branded_email(
+                    to_email="shop1@example.com",
+                    subject="Code",
+                    heading="Code",
+                    message="123456",
+                )
+            )
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_orjson_renderer_matches_stdlib_renderer(self):
+        from decimal import Decimal
+
+        from django.utils import timezone
+        from django.utils.translation import gettext_lazy
+        from rest_framework.exceptions import ErrorDetail
+        from rest_framework.renderers import JSONRenderer
+
+        from lulu_bingo.renderers import ORJSONRenderer
+
+        from .serializers import serialize_shop_user
+
+        payload = {
+            "user": serialize_shop_user(self.user),
+            "at": timezone.now(),
+            "amount": Decimal("12.50"),
+            "errors": {"otp": [ErrorDetail("Invalid", code="invalid")]},
+            "label": gettext_lazy("Login"),
+            "sep": "a\u2028b",
+            1: "int key",
+        }
+        self.assertEqual(ORJSONRenderer().render(payload), JSONRenderer().render(payload))
+
+    @override_settings(EMAIL_ASYNC_MAX_RETRIES=1, EMAIL_ASYNC_RETRY_DELAY=0)
+    def test_background_email_delivery_retries_failures(self):
+        from . import emailing
+
+        with patch.object(emailing, "_ensure_email_sender"):
+            emailing._queue_email(object(), "shop1@example.com")
+        with patch.object(emailing, "_deliver_email", return_value=False) as deliver:
+            self.assertTrue(emailing._process_email_queue(0))
+            self.assertTrue(emailing._process_email_queue(0))
+            self.assertFalse(emailing._process_email_queue(0))
+        # One attempt plus one retry, then the message is dropped.
+        self.assertEqual(deliver.call_count, 2)
+        self.assertEqual(emailing._email_retries, [])
+
+    def test_two_factor_setup_reuses_existing_secret_without_writing(self):
+        login_resp = self.client.post(reverse("login"), {"username": "shop1", "password": "pass1234"}, format="json")
+        headers = {"HTTP_AUTHORIZATION": f"Token {login_resp.data['token']}"}
+
+        first = self.client.get(reverse("2fa-setup"), **headers)
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+
+        # Token lookup only; the secret already exists, so nothing is saved.
+        with self.assertNumQueries(1):
+            second = self.client.get(reverse("2fa-setup"), **headers)
+        self.assertEqual(second.data, first.data)
+
+    @override_settings(LOGIN_RATE_LIMIT=2)
+    def test_login_is_rate_limited_after_repeated_failures(self):
+        url = reverse("login")
+        for _ in range(2):
+            resp = self.client.post(url, {"username": "shop1", "password": "wrong"}, format="json")
+            self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+        with self.assertNumQueries(0):
+            resp = self.client.post(url, {"username": "shop1", "password": "pass1234"}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    @override_settings(LOGIN_RATE_LIMIT=2)
+    def test_login_rate_limit_ignores_spoofed_forwarded_for(self):
+        url = reverse("login")
+        for spoofed in ("203.0.113.1", "203.0.113.2"):
+            resp = self.client.post(
+                url,
+                {"username": "shop1", "password": "wrong"},
+                format="json",
+                HTTP_X_FORWARDED_FOR=f"{spoofed}, 198.51.100.7",
+            )
+            self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+        resp = self.client.post(
+            url,
+            {"username": "shop1", "password": "pass1234"},
+            format="json",
+            HTTP_X_FORWARDED_FOR="203.0.113.3, 198.51.100.7",
+        )
+        self.assertEqual(resp.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
@@ -1,13 +1,21 @@
 import os
 import re
+import atexit
+import hashlib
 import ipaddress
 import json
+import logging
+import secrets
+import threading
+from collections import deque
 from functools import lru_cache
 from urllib.error import URLError
 from urllib.request import Request, urlopen
 
 from django.conf import settings
 from django.contrib.auth.tokens import default_token_generator
+from django.core.cache import cache
+from django.db import connections, transaction
 from django.utils import timezone
 from django.utils.encoding import force_bytes
 from django.utils.http import urlsafe_base64_encode
@@ -34,14 +42,23 @@ from .serializers import (
     TwoFactorEmailCodeSerializer,
     TwoFactorEnableSerializer,
     TwoFactorSetupSerializer,
+    serialize_shop_user,
 )
 
+logger = logging.getLogger(__name__)
+
+_USER_PAYLOAD_CACHE_SECONDS = 60
+
+# Read once at import; the issuer is baked into authenticator app entries.
+_TWO_FACTOR_ISSUER = os.getenv("TWO_FACTOR_ISSUER", "LuluBingo")
+
 
 def _get_client_ip(request):
-    x_forwarded_for = request.META.get("HTTP_X_FORWARDED_FOR")
+    meta = request.META
+    x_forwarded_for = meta.get("HTTP_X_FORWARDED_FOR")
     if x_forwarded_for:
-        return x_forwarded_for.split(",")[0].strip()
-    return request.META.get("REMOTE_ADDR")
+        return x_forwarded_for.partition(",")[0].strip()
+    return meta.get("REMOTE_ADDR")
 
 
 @lru_cache(maxsize=512)
@@ -81,7 +98,7 @@ def _lookup_address_from_ip(ip_address: str) -> str:
     return "Address unavailable"
 
 
-def _get_client_address(request) -> str:
+def _get_client_address(request, client_ip: str | None = None) -> str:
     meta = request.META
     city = (
         meta.get("HTTP_CF_IPCITY")
@@ -110,15 +127,14 @@ def _get_client_address(request) -> str:
     if parts:
         return ", ".join(parts)
 
-    return _lookup_address_from_ip(_get_client_ip(request) or "")
+    if client_ip is None:
+        client_ip = _get_client_ip(request)
+    return _lookup_address_from_ip(client_ip or "")
 
 
-def _get_browser_name(request) -> str:
-    user_agent = (request.META.get("HTTP_USER_AGENT") or "").strip().lower()
-    if not user_agent:
-        return "Unknown browser"
-
-    browser_checks = [
+_BROWSER_PATTERNS = [
+    (re.compile(pattern), browser_name)
+    for pattern, browser_name in (
         (r"edg/", "Microsoft Edge"),
         (r"opr/|opera", "Opera"),
         (r"firefox|fxios", "Firefox"),
@@ -129,10 +145,19 @@ def _get_browser_name(request) -> str:
         (r"postmanruntime", "Postman Runtime"),
         (r"curl", "curl"),
         (r"httpie", "HTTPie"),
-    ]
-    for pattern, browser_name in browser_checks:
-        if re.search(pattern, user_agent):
-            if browser_name == "Safari" and re.search(r"chrome|crios|opr/|edg/", user_agent):
+    )
+]
+_NON_SAFARI_WEBKIT_RE = re.compile(r"chrome|crios|opr/|edg/")
+
+
+def _get_browser_name(request) -> str:
+    user_agent = (request.META.get("HTTP_USER_AGENT") or "").strip().lower()
+    if not user_agent:
+        return "Unknown browser"
+
+    for pattern, browser_name in _BROWSER_PATTERNS:
+        if pattern.search(user_agent):
+            if browser_name == "Safari" and _NON_SAFARI_WEBKIT_RE.search(user_agent):
                 continue
             return browser_name
     return "Unknown browser"
@@ -158,15 +183,175 @@ def _get_device_os(request) -> str:
     return "Unknown device"
 
 
-def _record_attempt(username: str, success: bool, request, user=None):
-    LoginAttempt.objects.create(
+_pending_failed_attempts: deque[LoginAttempt] = deque()
+_pending_failed_attempts_lock = threading.Lock()
+_attempt_flush_requested = threading.Event()
+_attempt_writer: threading.Thread | None = None
+
+
+def flush_login_attempts() -> int:
+    """Write buffered failed login attempts in one ``bulk_create``."""
+    with _pending_failed_attempts_lock:
+        pending = list(_pending_failed_attempts)
+        _pending_failed_attempts.clear()
+    if pending:
+        try:
+            # A backlog larger than one batch still commits once.
+            with transaction.atomic():
+                LoginAttempt.objects.bulk_create(pending, batch_size=500)
+        except Exception:
+            # Put the batch back ahead of anything buffered meanwhile so the
+            # next flush retries it instead of losing the audit rows.
+            with _pending_failed_attempts_lock:
+                _pending_failed_attempts.extendleft(reversed(pending))
+            raise
+    return len(pending)
+
+
+def _flush_login_attempts_in_background():
+    try:
+        if flush_login_attempts():
+            connections.close_all()
+    except Exception:
+        logger.exception("Could not write buffered login attempts")
+        connections.close_all()
+
+
+def _login_attempt_writer():
+    # Flushes when a request fills the buffer, or every
+    # LOGIN_ATTEMPT_FLUSH_SECONDS so a quiet period never strands rows.
+    while True:
+        _attempt_flush_requested.wait(float(getattr(settings, "LOGIN_ATTEMPT_FLUSH_SECONDS", 5)))
+        _attempt_flush_requested.clear()
+        _flush_login_attempts_in_background()
+
+
+def _ensure_attempt_writer() -> None:
+    global _attempt_writer
+    if _attempt_writer is None or not _attempt_writer.is_alive():
+        _attempt_writer = threading.Thread(
+            target=_login_attempt_writer,
+            daemon=True,
+            name="lulubingo-login-attempts",
+        )
+        _attempt_writer.start()
+
+
+def _buffer_failed_attempt(attempt: LoginAttempt, buffer_size: int) -> None:
+    with _pending_failed_attempts_lock:
+        _pending_failed_attempts.append(attempt)
+        buffer_full = len(_pending_failed_attempts) >= buffer_size
+        _ensure_attempt_writer()
+    if not buffer_full:
+        return
+    if getattr(settings, "LOGIN_ATTEMPT_ASYNC_FLUSH", True):
+        _attempt_flush_requested.set()
+    else:
+        flush_login_attempts()
+
+
+def _record_attempt(username: str, success: bool, request, user=None, client_ip: str | None = None):
+    if client_ip is None:
+        client_ip = _get_client_ip(request)
+    attempt = LoginAttempt(
         username=username,
         success=success,
-        ip_address=_get_client_ip(request),
+        ip_address=client_ip,
         user=user if success else None,
         user_agent=request.META.get("HTTP_USER_AGENT", "")[:512],
-        timestamp=timezone.now(),
     )
+    # Successful attempts drive the known-device check, so they are always
+    # written immediately; only failures (the credential-stuffing volume)
+    # are buffered.
+    buffer_size = int(getattr(settings, "LOGIN_ATTEMPT_BUFFER_SIZE", 0))
+    if success or buffer_size <= 1:
+        attempt.save(force_insert=True)
+        return
+    _buffer_failed_attempt(attempt, buffer_size)
+
+
+atexit.register(_flush_login_attempts_in_background)
+
+
+def _rate_limit_client_ip(request) -> str:
+    # The first X-Forwarded-For hop is whatever the client sent; only the hop
+    # appended by our own proxy (the last one) or REMOTE_ADDR can be trusted.
+    meta = request.META
+    x_forwarded_for = meta.get("HTTP_X_FORWARDED_FOR")
+    if x_forwarded_for:
+        return x_forwarded_for.rpartition(",")[2].strip()
+    return meta.get("REMOTE_ADDR") or ""
+
+
+def _login_failure_key(request) -> str:
+    username = str(request.data.get("username", ""))
+    client_ip = _rate_limit_client_ip(request)
+    digest = hashlib.sha256(f"{client_ip}\0{username}".encode()).hexdigest()[:32]
+    return f"login-failures:{digest}"
+
+
+def _login_rate_limited(failure_key: str) -> bool:
+    limit = int(getattr(settings, "LOGIN_RATE_LIMIT", 0))
+    return limit > 0 and cache.get(failure_key, 0) >= limit
+
+
+def _count_login_failure(failure_key: str) -> None:
+    if int(getattr(settings, "LOGIN_RATE_LIMIT", 0)) <= 0:
+        return
+    window = int(getattr(settings, "LOGIN_RATE_LIMIT_WINDOW_SECONDS", 300))
+    # add() starts the window; incr() keeps its original expiry.
+    if not cache.add(failure_key, 1, window):
+        try:
+            cache.incr(failure_key)
+        except ValueError:
+            cache.add(failure_key, 1, window)
+
+
+def _new_token_key() -> str:
+    # Same 40-hex-char format as Token.generate_key(), in a single call.
+    return secrets.token_hex(20)
+
+
+def _rotate_token(user) -> str:
+    """Give ``user`` a fresh auth token key, invalidating the old one."""
+    key = _new_token_key()
+    # The key is the primary key, so rotate it in place with one UPDATE.
+    if not Token.objects.filter(user=user).update(key=key, created=timezone.now()):
+        Token.objects.create(user=user, key=key)
+    return key
+
+
+class _PrerenderedResponse(Response):
+    """Response whose JSON body was rendered ahead of time and cached."""
+
+    def __init__(self, data, body: bytes):
+        super().__init__(data)
+        self._prerendered_body = body
+
+    @property
+    def rendered_content(self):
+        self["Content-Type"] = self.accepted_renderer.media_type
+        return self._prerendered_body
+
+
+def _cached_user_response(request, prefix: str, build) -> Response:
+    user = request.user
+    renderer = request.accepted_renderer
+    # Plain JSON requests reuse the rendered bytes; the browsable API and
+    # ?indent= variants render the cached payload as usual.
+    prerender = renderer.format == "json" and request.accepted_media_type == renderer.media_type
+    # updated_at moves on every save, so a changed user never hits a stale
+    # entry; the TTL only bounds memory.
+    cache_key = f"{prefix}:{'json' if prerender else 'data'}:{user.pk}:{user.updated_at.timestamp()}"
+    cached = cache.get(cache_key)
+    if cached is None:
+        payload = build(user)
+        cached = (payload, renderer.render(payload, renderer.media_type) if prerender else None)
+        cache.set(cache_key, cached, _USER_PAYLOAD_CACHE_SECONDS)
+    payload, body = cached
+    if body is None:
+        return Response(payload)
+    return _PrerenderedResponse(payload, body)
 
 
 def _send_security_email(user, subject: str, message: str) -> bool:
@@ -223,18 +408,30 @@ class LoginView(APIView):
         tags=["Authentication"],
     )
     def post(self, request):
+        client_ip = _get_client_ip(request)
+        failure_key = _login_failure_key(request)
+        if _login_rate_limited(failure_key):
+            return Response(
+                {"detail": "Too many failed login attempts. Please try again later."},
+                status=status.HTTP_429_TOO_MANY_REQUESTS,
+            )
+
         serializer = LoginSerializer(data=request.data, context={"request": request})
         if not serializer.is_valid():
-            _record_attempt(request.data.get("username", ""), False, request)
+            _count_login_failure(failure_key)
+            _record_attempt(request.data.get("username", ""), False, request, client_ip=client_ip)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+        cache.delete(failure_key)
         user = serializer.validated_data["user"]
-        token, _ = Token.objects.get_or_create(user=user)
-        _record_attempt(user.username, True, request, user=user)
+        token_key = Token.objects.filter(user=user).values_list("key", flat=True).first()
+        if token_key is None:
+            token_key = Token.objects.get_or_create(user=user, defaults={"key": _new_token_key()})[0].key
+        _record_attempt(user.username, True, request, user=user, client_ip=client_ip)
         missing_profile_fields = _get_missing_profile_fields(user)
         login_time = timezone.now()
-        ip_address = _get_client_ip(request) or "unknown"
-        client_address = _get_client_address(request)
+        ip_address = client_ip or "unknown"
+        client_address = _get_client_address(request, client_ip)
         browser_name = _get_browser_name(request)
         device_os = _get_device_os(request)
         _send_security_email(
@@ -252,8 +449,8 @@ class LoginView(APIView):
         )
         return Response(
             {
-                "token": token.key,
-                "user": ShopUserSerializer(user).data,
+                "token": token_key,
+                "user": serialize_shop_user(user),
                 "requires_password_change": user.must_change_password,
                 "missing_profile_fields": missing_profile_fields,
             }
@@ -287,7 +484,7 @@ class MeView(APIView):
         tags=["Authentication"],
     )
     def get(self, request):
-        return Response({"user": ShopUserSerializer(request.user).data})
+        return _cached_user_response(request, "me", lambda user: {"user": serialize_shop_user(user)})
 
 
 class ChangePasswordView(APIView):
@@ -308,9 +505,10 @@ class ChangePasswordView(APIView):
         user = request.user
         user.set_password(serializer.validated_data["new_password"])
         user.must_change_password = False
-        user.save(update_fields=["password", "must_change_password"])
-        Token.objects.filter(user=user).delete()
-        new_token = Token.objects.create(user=user)
+        # Password and token change together; the email goes out after commit.
+        with transaction.atomic():
+            user.save(update_fields=["password", "must_change_password"])
+            new_token_key = _rotate_token(user)
         _send_security_email(
             user,
             "Password changed",
@@ -318,8 +516,8 @@ class ChangePasswordView(APIView):
         )
         return Response(
             {
-                "token": new_token.key,
-                "user": ShopUserSerializer(user).data,
+                "token": new_token_key,
+                "user": serialize_shop_user(user),
                 "requires_password_change": user.must_change_password,
                 "missing_profile_fields": _get_missing_profile_fields(user),
             }
@@ -337,7 +535,9 @@ class ShopProfileView(APIView):
         tags=["Shop"],
     )
     def get(self, request):
-        return Response(ShopProfileSerializer(request.user).data)
+        return _cached_user_response(
+            request, "profile", lambda user: dict(ShopProfileSerializer(user).data)
+        )
 
     @extend_schema(
         request=ShopProfileSerializer,
@@ -415,10 +615,9 @@ class PasswordResetConfirmView(APIView):
 
         user.set_password(serializer.validated_data["new_password"])
         user.must_change_password = False
-        user.save(update_fields=["password", "must_change_password"])
-
-        Token.objects.filter(user=user).delete()
-        token = Token.objects.create(user=user)
+        with transaction.atomic():
+            user.save(update_fields=["password", "must_change_password"])
+            token_key = _rotate_token(user)
 
         _send_security_email(
             user,
@@ -428,13 +627,18 @@ class PasswordResetConfirmView(APIView):
 
         return Response(
             {
-                "token": token.key,
-                "user": ShopUserSerializer(user).data,
+                "token": token_key,
+                "user": serialize_shop_user(user),
                 "requires_password_change": user.must_change_password,
             }
         )
 
 
+@lru_cache(maxsize=1024)
+def _totp_provisioning_uri(secret: str, username: str, issuer: str) -> str:
+    return pyotp.TOTP(secret).provisioning_uri(name=f"{issuer}:{username}", issuer_name=issuer)
+
+
 class TwoFactorSetupView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
@@ -444,13 +648,10 @@ class TwoFactorSetupView(APIView):
     )
     def get(self, request):
         user = request.user
-        user.ensure_totp_secret()
-        user.save(update_fields=["totp_secret"])
+        if user.ensure_totp_secret():
+            user.save(update_fields=["totp_secret"])
 
-        issuer = os.getenv("TWO_FACTOR_ISSUER", "LuluBingo")
-        label = f"{issuer}:{user.username}"
-        totp = pyotp.TOTP(user.totp_secret)
-        uri = totp.provisioning_uri(name=label, issuer_name=issuer)
+        uri = _totp_provisioning_uri(user.totp_secret, user.username, _TWO_FACTOR_ISSUER)
         data = {"secret": user.totp_secret, "provisioning_uri": uri}
         return Response(data)
 
@@ -494,7 +695,7 @@ class TwoFactorEnableView(APIView):
             "Two-factor enabled",
             f"Two-factor authentication ({method}) was enabled on your shop account.",
         )
-        return Response(ShopUserSerializer(user).data)
+        return Response(serialize_shop_user(user))
 
 
 class TwoFactorDisableView(APIView):
@@ -533,7 +734,7 @@ class TwoFactorDisableView(APIView):
             "Two-factor disabled",
             f"Two-factor authentication ({method}) was disabled on your shop account. If this wasn't you, enable it again and contact support.",
         )
-        return Response(ShopUserSerializer(user).data)
+        return Response(serialize_shop_user(user))
 
 
 class TwoFactorEmailCodeView(APIView):
@@ -1,9 +1,28 @@
 from django.contrib import admin
+from django.db.models import Func, IntegerField, JSONField, Value
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
 from .models import Game
 
 
+class _JSONArrayLength(Func):
+    function = "JSON_ARRAY_LENGTH"
+    output_field = IntegerField()
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, function="JSONB_ARRAY_LENGTH", **extra_context)
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, function="JSON_LENGTH", **extra_context)
+
+
+# The changelist never renders these; some hold every cartella and draw.
+_GAME_JSON_FIELDS = tuple(
+    field.name for field in Game._meta.concrete_fields if isinstance(field, JSONField)
+)
+
+
 @admin.register(Game)
 class GameAdmin(admin.ModelAdmin):
     list_display = (
@@ -77,42 +96,44 @@ class GameAdmin(admin.ModelAdmin):
 
     actions = ["mark_active", "mark_completed", "mark_cancelled"]
 
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        match = getattr(request, "resolver_match", None)
+        if match is not None and match.url_name == "games_game_changelist":
+            queryset = queryset.annotate(
+                cartella_total=Coalesce(_JSONArrayLength("cartella_numbers"), 0)
+            ).defer(*_GAME_JSON_FIELDS)
+        return queryset
+
     @admin.display(description="Cartellas")
     def cartella_count(self, obj: Game) -> int:
+        if hasattr(obj, "cartella_total"):
+            return obj.cartella_total
         return len(obj.cartella_numbers or [])
 
     def mark_active(self, request, queryset):
-        updated = 0
-        for game in queryset:
-            if game.status != Game.Status.ACTIVE:
-                game.status = Game.Status.ACTIVE
-                game.started_at = game.started_at or timezone.now()
-                game.save(update_fields=["status", "started_at"])
-                updated += 1
+        updated = queryset.exclude(status=Game.Status.ACTIVE).update(
+            status=Game.Status.ACTIVE,
+            started_at=Coalesce("started_at", Value(timezone.now())),
+        )
         self.message_user(request, f"Marked {updated} game(s) active.")
 
     mark_active.short_description = "Mark selected games as active"
 
     def mark_completed(self, request, queryset):
-        updated = 0
-        for game in queryset:
-            if game.status != Game.Status.COMPLETED:
-                game.status = Game.Status.COMPLETED
-                game.ended_at = timezone.now()
-                game.save(update_fields=["status", "ended_at"])
-                updated += 1
+        updated = queryset.exclude(status=Game.Status.COMPLETED).update(
+            status=Game.Status.COMPLETED,
+            ended_at=timezone.now(),
+        )
         self.message_user(request, f"Marked {updated} game(s) completed.")
 
     mark_completed.short_description = "Mark selected games as completed"
 
     def mark_cancelled(self, request, queryset):
-        updated = 0
-        for game in queryset:
-            if game.status != Game.Status.CANCELLED:
-                game.status = Game.Status.CANCELLED
-                game.ended_at = timezone.now()
-                game.save(update_fields=["status", "ended_at"])
-                updated += 1
+        updated = queryset.exclude(status=Game.Status.CANCELLED).update(
+            status=Game.Status.CANCELLED,
+            ended_at=timezone.now(),
+        )
         self.message_user(request, f"Cancelled {updated} game(s).")
 
     mark_cancelled.short_description = "Cancel selected games"
@@ -1,32 +1,31 @@
+from decimal import Decimal
+
 from django.db import migrations, models
+from django.db.models import DecimalField, F, Value
+from django.db.models.functions import Coalesce, Greatest, Least
 
 
-def forwards(apps, schema_editor):
-    Game = apps.get_model("games", "Game")
+_PERCENT = DecimalField(max_digits=5, decimal_places=2)
 
-    for game in Game.objects.all().only("id", "win_percentage"):
-        win_percentage = game.win_percentage if game.win_percentage is not None else 90
-        try:
-            win_percentage_value = float(win_percentage)
-        except (TypeError, ValueError):
-            win_percentage_value = 90.0
 
-        cut_percentage = max(0.0, min(100.0, 100.0 - win_percentage_value))
-        Game.objects.filter(pk=game.pk).update(cut_percentage=cut_percentage)
+def _complement(field_name, default):
+    # 100 - field, clamped to [0, 100], computed in a single UPDATE.
+    hundred = Value(Decimal("100"), output_field=_PERCENT)
+    return Greatest(
+        Value(Decimal("0"), output_field=_PERCENT),
+        Least(hundred, hundred - Coalesce(F(field_name), Value(Decimal(default), output_field=_PERCENT))),
+        output_field=_PERCENT,
+    )
 
 
-def backwards(apps, schema_editor):
+def forwards(apps, schema_editor):
     Game = apps.get_model("games", "Game")
+    Game.objects.update(cut_percentage=_complement("win_percentage", "90"))
 
-    for game in Game.objects.all().only("id", "cut_percentage"):
-        cut_percentage = game.cut_percentage if game.cut_percentage is not None else 10
-        try:
-            cut_percentage_value = float(cut_percentage)
-        except (TypeError, ValueError):
-            cut_percentage_value = 10.0
 
-        win_percentage = max(0.0, min(100.0, 100.0 - cut_percentage_value))
-        Game.objects.filter(pk=game.pk).update(win_percentage=win_percentage)
+def backwards(apps, schema_editor):
+    Game = apps.get_model("games", "Game")
+    Game.objects.update(win_percentage=_complement("cut_percentage", "10"))
 
 
 class Migration(migrations.Migration):
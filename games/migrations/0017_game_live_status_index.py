@@ -0,0 +1,19 @@
+# Generated by Django 5.2.9 on 2026-10-16 00:22
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0016_game_bonus_awarded_amount_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(condition=models.Q(('status__in', ['pending', 'active'])), fields=['status', '-created_at'], name='g_game_live_status_idx'),
+        ),
+    ]
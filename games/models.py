@@ -2,11 +2,74 @@ import random
 import string
 
 from django.conf import settings
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import Q
 from django.utils import timezone
 from django.utils.text import slugify
 
 
+_DRAW_NUMBERS = list(range(1, 76))
+
+
+def shuffled_draw_sequence() -> list[int]:
+    """Return the numbers 1-75 in random order."""
+    # Shuffling a copy of a prebuilt list is about twice as fast as
+    # random.sample(range(1, 76), 75), which rebuilds its pool every call.
+    sequence = _DRAW_NUMBERS.copy()
+    random.shuffle(sequence)
+    return sequence
+
+
+def shuffled_draw_sequences(count: int) -> list[list[int]]:
+    """Return ``count`` independent shuffles of the numbers 1-75."""
+    shuffle = random.shuffle
+    sequences = [_DRAW_NUMBERS.copy() for _ in range(count)]
+    for sequence in sequences:
+        shuffle(sequence)
+    return sequences
+
+
+# Slug-based game codes share a small per-shop space, so candidates are
+# drawn in batches and checked with a single ``IN`` query.
+_CODE_CANDIDATES = 8
+
+# Random BINGO-/SHOP- codes skip that lookup; the unique constraint catches
+# the rare collision and the save is retried with a fresh code.
+_GENERATED_CODE_ATTEMPTS = 5
+
+
+def _first_unused_code(queryset, field: str, make_candidates) -> str:
+    attempt = 0
+    while True:
+        candidates = make_candidates(attempt)
+        taken = set(queryset.filter(**{f"{field}__in": candidates}).values_list(field, flat=True))
+        for candidate in candidates:
+            if candidate not in taken:
+                return candidate
+        attempt += 1
+
+
+_CODE_ALPHABET = string.ascii_uppercase + string.digits
+
+
+def _random_code(prefix: str, length: int) -> str:
+    return prefix + "".join(random.choices(_CODE_ALPHABET, k=length))
+
+
+def _save_with_generated_code(instance, field: str, ensure_code, save, *args, **kwargs):
+    for attempt in range(_GENERATED_CODE_ATTEMPTS):
+        try:
+            with transaction.atomic(using=kwargs.get("using")):
+                save(*args, **kwargs)
+            return
+        except IntegrityError as exc:
+            # Only a clash on the code this save generated is retried.
+            if field not in str(exc) or attempt == _GENERATED_CODE_ATTEMPTS - 1:
+                raise
+            setattr(instance, field, "")
+            ensure_code()
+
+
 class Game(models.Model):
     class Mode(models.TextChoices):
         STANDARD = "standard", "Standard"
@@ -67,41 +130,60 @@ class Game(models.Model):
             models.Index(fields=["shop", "-created_at"], name="games_game_shop_created_idx"),
             models.Index(fields=["shop", "status", "-created_at"], name="g_game_shop_stat_created_idx"),
             models.Index(fields=["shop", "game_code"], name="games_game_shop_code_idx"),
+            # Cross-shop admin listing of live games; finished games are the
+            # bulk of the table and stay out of this index.
+            models.Index(
+                fields=["status", "-created_at"],
+                condition=Q(status__in=["pending", "active"]),
+                name="g_game_live_status_idx",
+            ),
         ]
 
     def __str__(self):
         return f"Game {self.game_code} ({self.shop.username})"
 
-    def _ensure_game_code(self):
+    def _ensure_game_code(self) -> bool:
+        """Fill in ``game_code``; True when it is an unchecked random BINGO- code."""
         if self.game_code:
-            return
+            return False
         if self.game_mode in {self.Mode.SHOP_FIXED4, self.Mode.SHOP_ONLINE, self.Mode.SHOP_OFFLINE}:
-            candidate = f"BINGO-{''.join(random.choices(string.ascii_uppercase + string.digits, k=5))}"
-            while type(self).objects.filter(game_code=candidate).exists():
-                candidate = f"BINGO-{''.join(random.choices(string.ascii_uppercase + string.digits, k=5))}"
-            self.game_code = candidate
-            return
+            self.game_code = _random_code("BINGO-", 5)
+            return True
 
         base = slugify(getattr(self.shop, "shop_code", None) or self.shop.username) or "game"
-        suffix = random.randint(1000, 9999)
-        candidate = f"{base}-{suffix}"
-        while type(self).objects.filter(game_code=candidate).exists():
-            suffix += 1
-            candidate = f"{base}-{suffix}"
-        self.game_code = candidate
+
+        def suffixed(attempt):
+            # Four-digit suffixes first; widen the range if a shop ever runs out.
+            upper = 10_000 * 10**attempt
+            return [f"{base}-{suffix}" for suffix in random.sample(range(1000, upper), _CODE_CANDIDATES)]
+
+        self.game_code = _first_unused_code(type(self).objects.all(), "game_code", suffixed)
+        return False
 
     def _ensure_draws(self):
-        if not self.draw_sequence:
-            self.draw_sequence = random.sample(range(1, 76), 75)
-        if not self.cartella_draw_sequences:
-            self.cartella_draw_sequences = [random.sample(range(1, 76), 75) for _ in self.cartella_numbers]
+        needs_master = not self.draw_sequence
+        needs_cartellas = not self.cartella_draw_sequences
+        if needs_master or needs_cartellas:
+            # One batch for the master order and every cartella's order.
+            sequences = shuffled_draw_sequences(
+                needs_master + (len(self.cartella_numbers) if needs_cartellas else 0)
+            )
+            if needs_master:
+                self.draw_sequence = sequences.pop()
+            if needs_cartellas:
+                self.cartella_draw_sequences = sequences
         if self.called_numbers is None:
             self.called_numbers = []
 
     def save(self, *args, **kwargs):
-        self._ensure_game_code()
+        # Slug codes are pre-checked with an IN query, so only random BINGO-
+        # codes pay for the retry savepoint; other inserts stay one statement.
+        random_code = self._ensure_game_code()
         self._ensure_draws()
-        super().save(*args, **kwargs)
+        if random_code:
+            _save_with_generated_code(self, "game_code", self._ensure_game_code, super().save, *args, **kwargs)
+        else:
+            super().save(*args, **kwargs)
 
 
 class ShopBingoSession(models.Model):
@@ -140,11 +222,12 @@ class ShopBingoSession(models.Model):
     def _ensure_session_id(self):
         if self.session_id:
             return
-        candidate = f"SHOP-{''.join(random.choices(string.ascii_uppercase + string.digits, k=6))}"
-        while type(self).objects.filter(session_id=candidate).exists():
-            candidate = f"SHOP-{''.join(random.choices(string.ascii_uppercase + string.digits, k=6))}"
-        self.session_id = candidate
+        self.session_id = _random_code("SHOP-", 6)
 
     def save(self, *args, **kwargs):
+        generated = not self.session_id
         self._ensure_session_id()
-        super().save(*args, **kwargs)
+        if generated:
+            _save_with_generated_code(self, "session_id", self._ensure_session_id, super().save, *args, **kwargs)
+        else:
+            super().save(*args, **kwargs)
@@ -1,5 +1,7 @@
 import random
 from decimal import Decimal, ROUND_HALF_UP
+from functools import lru_cache
+from itertools import chain
 from typing import List
 
 from django.db import transaction as db_transaction
@@ -12,6 +14,13 @@ from .models import Game, ShopBingoSession
 from transactions.models import Transaction
 from transactions.services import apply_transaction
 
+_ZERO = Decimal("0")
+_HUNDRED = Decimal("100")
+_CENT = Decimal("0.01")
+_DEFAULT_CUT = Decimal("10")
+_DEFAULT_LULU_CUT = Decimal("15")
+_MIN_BET = Decimal("10.00")
+
 
 def _normalize_cartella_board(board: list[int] | tuple[int, ...] | None) -> list[int] | None:
     if not isinstance(board, (list, tuple)):
@@ -25,6 +34,23 @@ def _normalize_cartella_board(board: list[int] | tuple[int, ...] | None) -> list
     return normalized
 
 
+@lru_cache(maxsize=4096)
+def _board_win_mask(board: tuple) -> int | None:
+    """Bitmask of a normalized board's numbers, skipping the free centre.
+
+    Returns None when the board holds anything other than small
+    non-negative ints, in which case callers fall back to set lookups.
+    """
+    mask = 0
+    for index, number in enumerate(board):
+        if index == 12:
+            continue
+        if type(number) is not int or not 0 <= number < 128:
+            return None
+        mask |= 1 << number
+    return mask
+
+
 def _resolve_game_financials(game: Game) -> tuple[Decimal, Decimal, Decimal, Decimal, Decimal]:
     total_pool = (
         game.total_pool
@@ -32,29 +58,29 @@ def _resolve_game_financials(game: Game) -> tuple[Decimal, Decimal, Decimal, Dec
         else game.bet_amount * Decimal(len(game.cartella_numbers))
     )
 
-    cut_percentage = Decimal(str(game.cut_percentage if game.cut_percentage is not None else Decimal("10")))
-    cut_percentage = max(Decimal("0"), min(Decimal("100"), cut_percentage))
+    cut_percentage = Decimal(str(game.cut_percentage if game.cut_percentage is not None else _DEFAULT_CUT))
+    cut_percentage = max(_ZERO, min(_HUNDRED, cut_percentage))
 
     lulu_cut_percentage = Decimal(
         str(
             game.lulu_cut_percentage
             if game.lulu_cut_percentage is not None
-            else getattr(game.shop, "lulu_cut_percentage", Decimal("15"))
+            else getattr(game.shop, "lulu_cut_percentage", _DEFAULT_LULU_CUT)
         )
     )
-    lulu_cut_percentage = max(Decimal("0"), min(Decimal("100"), lulu_cut_percentage))
+    lulu_cut_percentage = max(_ZERO, min(_HUNDRED, lulu_cut_percentage))
 
-    shop_cut = (total_pool * cut_percentage / Decimal("100")).quantize(
-        Decimal("0.01"), rounding=ROUND_HALF_UP
+    shop_cut = (total_pool * cut_percentage / _HUNDRED).quantize(
+        _CENT, rounding=ROUND_HALF_UP
     )
-    lulu_cut = (shop_cut * lulu_cut_percentage / Decimal("100")).quantize(
-        Decimal("0.01"), rounding=ROUND_HALF_UP
+    lulu_cut = (shop_cut * lulu_cut_percentage / _HUNDRED).quantize(
+        _CENT, rounding=ROUND_HALF_UP
     )
     shop_net_cut = (shop_cut - lulu_cut).quantize(
-        Decimal("0.01"), rounding=ROUND_HALF_UP
+        _CENT, rounding=ROUND_HALF_UP
     )
     payout_amount = (total_pool - shop_cut).quantize(
-        Decimal("0.01"), rounding=ROUND_HALF_UP
+        _CENT, rounding=ROUND_HALF_UP
     )
     return total_pool, payout_amount, shop_cut, lulu_cut, shop_net_cut
 
@@ -115,6 +141,29 @@ class GameSerializer(serializers.ModelSerializer):
         return list(range(1, len(obj.cartella_numbers or []) + 1))
 
 
+class GameHistorySerializer(GameSerializer):
+    """Subset of GameSerializer read by the shop history report."""
+
+    class Meta(GameSerializer.Meta):
+        fields = [
+            "game_code",
+            "num_players",
+            "assigned_cartella_numbers",
+            "status",
+            "winners",
+            "banned_cartellas",
+            "total_pool",
+            "payout_amount",
+            "shop_cut_amount",
+            "lulu_cut_amount",
+            "shop_net_cut_amount",
+            "winning_pattern",
+            "created_at",
+            "ended_at",
+        ]
+        read_only_fields = fields
+
+
 class GameCreateSerializer(serializers.ModelSerializer):
     cartella_numbers = serializers.ListField(child=serializers.ListField(child=serializers.IntegerField()), allow_empty=False)
 
@@ -125,13 +174,11 @@ class GameCreateSerializer(serializers.ModelSerializer):
     def validate_cartella_numbers(self, value: List[List[int]]):
         if not value:
             raise serializers.ValidationError("Provide at least one cartella")
-        flat_len = sum(len(c) for c in value)
-        if flat_len == 0:
+        numbers = list(chain.from_iterable(value))
+        if not numbers:
             raise serializers.ValidationError("Cartella numbers cannot be empty")
-        for cartella in value:
-            for n in cartella:
-                if n < 1 or n > 75:
-                    raise serializers.ValidationError("Cartella numbers must be between 1 and 75")
+        if min(numbers) < 1 or max(numbers) > 75:
+            raise serializers.ValidationError("Cartella numbers must be between 1 and 75")
         return value
 
     def validate(self, attrs):
@@ -147,25 +194,13 @@ class GameCreateSerializer(serializers.ModelSerializer):
         cartellas = validated_data["cartella_numbers"]
         total_bet = validated_data["bet_amount"] * len(cartellas)
 
-        cut_percentage_raw = getattr(user, "shop_cut_percentage", Decimal("10"))
-        lulu_cut_percentage_raw = getattr(user, "lulu_cut_percentage", Decimal("15"))
-        try:
-            cut_percentage = Decimal(str(cut_percentage_raw))
-        except Exception:
-            cut_percentage = Decimal("10")
-        try:
-            lulu_cut_percentage = Decimal(str(lulu_cut_percentage_raw))
-        except Exception:
-            lulu_cut_percentage = Decimal("15")
-
-        cut_percentage = max(Decimal("0"), min(Decimal("100"), cut_percentage))
-        lulu_cut_percentage = max(Decimal("0"), min(Decimal("100"), lulu_cut_percentage))
-
-        estimated_shop_cut = (total_bet * cut_percentage / Decimal("100")).quantize(
-            Decimal("0.01"), rounding=ROUND_HALF_UP
+        cut_percentage, lulu_cut_percentage = user.cut_percentages()
+
+        estimated_shop_cut = (total_bet * cut_percentage / _HUNDRED).quantize(
+            _CENT, rounding=ROUND_HALF_UP
         )
-        estimated_lulu_cut = (estimated_shop_cut * lulu_cut_percentage / Decimal("100")).quantize(
-            Decimal("0.01"), rounding=ROUND_HALF_UP
+        estimated_lulu_cut = (estimated_shop_cut * lulu_cut_percentage / _HUNDRED).quantize(
+            _CENT, rounding=ROUND_HALF_UP
         )
 
         if Decimal(str(user.wallet_balance)) < estimated_lulu_cut:
@@ -179,27 +214,44 @@ class GameCreateSerializer(serializers.ModelSerializer):
                 }
             )
 
-        win_percentage = Decimal("100") - cut_percentage
-
-        with db_transaction.atomic():
-            game = Game.objects.create(
-                shop=user,
-                bet_amount=validated_data["bet_amount"],
-                num_players=validated_data["num_players"],
-                win_amount=validated_data["win_amount"],
-                total_pool=total_bet,
-                cut_percentage=cut_percentage,
-                lulu_cut_percentage=lulu_cut_percentage,
-                win_percentage=win_percentage,
-                cartella_numbers=cartellas,
-                cartella_statuses={str(index): "active" for index in range(len(cartellas))},
-                status=Game.Status.ACTIVE,
-                started_at=timezone.now(),
-            )
+        win_percentage = _HUNDRED - cut_percentage
+
+        game = Game.objects.create(
+            shop=user,
+            bet_amount=validated_data["bet_amount"],
+            num_players=validated_data["num_players"],
+            win_amount=validated_data["win_amount"],
+            total_pool=total_bet,
+            cut_percentage=cut_percentage,
+            lulu_cut_percentage=lulu_cut_percentage,
+            win_percentage=win_percentage,
+            cartella_numbers=cartellas,
+            cartella_statuses=dict.fromkeys(map(str, range(len(cartellas))), "active"),
+            status=Game.Status.ACTIVE,
+            started_at=timezone.now(),
+        )
 
         return game
 
 
+_COMPLETE_UPDATE_FIELDS = (
+    "status",
+    "is_paused",
+    "winners",
+    "ended_at",
+    "total_pool",
+    "payout_amount",
+    "shop_cut_amount",
+    "lulu_cut_amount",
+    "shop_net_cut_amount",
+    "bonus_contribution_amount",
+    "bonus_awarded_amount",
+    "bonus_awarded_cartella_index",
+    "payout_credited_at",
+    "refund_credited_at",
+)
+
+
 class GameCompleteSerializer(serializers.ModelSerializer):
     winners = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=True)
     status = serializers.ChoiceField(choices=[Game.Status.COMPLETED, Game.Status.CANCELLED])
@@ -220,8 +272,7 @@ class GameCompleteSerializer(serializers.ModelSerializer):
             if not winners:
                 raise serializers.ValidationError({"winners": "At least one winner is required for completed games"})
             cartella_count = len(game.cartella_numbers)
-            invalid_indexes = [winner for winner in winners if winner < 0 or winner >= cartella_count]
-            if invalid_indexes:
+            if min(winners) < 0 or max(winners) >= cartella_count:
                 raise serializers.ValidationError({"winners": "Winner indexes out of range"})
 
         return attrs
@@ -272,24 +323,15 @@ class GameCompleteSerializer(serializers.ModelSerializer):
             instance.is_paused = False
             instance.winners = winners
             instance.ended_at = instance.ended_at or timezone.now()
-            instance.save(
-                update_fields=[
-                    "status",
-                    "is_paused",
-                    "winners",
-                    "ended_at",
-                    "total_pool",
-                    "payout_amount",
-                    "shop_cut_amount",
-                    "lulu_cut_amount",
-                    "shop_net_cut_amount",
-                    "bonus_contribution_amount",
-                    "bonus_awarded_amount",
-                    "bonus_awarded_cartella_index",
-                    "payout_credited_at",
-                    "refund_credited_at",
-                ]
+            # Conditional UPDATE: a concurrent complete/cancel that got there
+            # first leaves no matching row, and the wallet debit above rolls back.
+            updated = (
+                Game.objects.filter(pk=instance.pk)
+                .exclude(status__in=[Game.Status.COMPLETED, Game.Status.CANCELLED])
+                .update(**{field: getattr(instance, field) for field in _COMPLETE_UPDATE_FIELDS})
             )
+            if not updated:
+                raise serializers.ValidationError("Game is already finalized")
         return instance
 
 
@@ -326,18 +368,37 @@ class GameClaimSerializer(serializers.Serializer):
         if cartella_index >= len(game.cartella_numbers):
             raise serializers.ValidationError({"cartella_index": "Cartella index out of range"})
 
-        called_set = set(called_numbers)
         cartella_numbers = _normalize_cartella_board(game.cartella_numbers[cartella_index])
         if cartella_numbers is None:
             raise serializers.ValidationError({"cartella_index": "Cartella board data is invalid"})
 
-        winning_numbers = [number for index, number in enumerate(cartella_numbers) if index != 12]
-
-        missing_numbers = [number for number in winning_numbers if number not in called_set]
+        required_count = len(cartella_numbers) - 1
+        win_mask = _board_win_mask(tuple(cartella_numbers))
+        called_mask = 0
+        for number in called_numbers:
+            called_mask |= 1 << number
+
+        # A winning claim needs no per-number work; only a miss lists what is left.
+        if win_mask is not None and not win_mask & ~called_mask:
+            missing_numbers = []
+        elif win_mask is not None:
+            # Valid boards hold small ints, so membership is a bit test.
+            missing_numbers = [
+                number
+                for index, number in enumerate(cartella_numbers)
+                if index != 12 and not called_mask >> number & 1
+            ]
+        else:
+            called_set = set(called_numbers)
+            missing_numbers = [
+                number
+                for index, number in enumerate(cartella_numbers)
+                if index != 12 and number not in called_set
+            ]
         attrs["is_bingo"] = len(missing_numbers) == 0
         attrs["missing_numbers"] = missing_numbers
-        attrs["matched_count"] = len(winning_numbers) - len(missing_numbers)
-        attrs["required_count"] = len(winning_numbers)
+        attrs["matched_count"] = required_count - len(missing_numbers)
+        attrs["required_count"] = required_count
         return attrs
 
 
@@ -365,7 +426,7 @@ class ShopBingoSessionCreateSerializer(serializers.Serializer):
     play_mode = serializers.ChoiceField(choices=ShopBingoSession.PlayMode.choices, required=False, default=ShopBingoSession.PlayMode.OFFLINE)
 
     def validate_min_bet_per_cartella(self, value: Decimal):
-        if value < Decimal("10.00"):
+        if value < _MIN_BET:
             raise serializers.ValidationError("Minimum bet per cartella is 10 ETB")
         return value
 
@@ -392,7 +453,7 @@ class ShopBingoCartellaSelectSerializer(serializers.Serializer):
         return value
 
     def validate_bet_per_cartella(self, value: Decimal):
-        if value < Decimal("10.00"):
+        if value < _MIN_BET:
             raise serializers.ValidationError("Minimum bet per cartella is 10 ETB")
         return value
 
@@ -1,3 +1,7 @@
+from decimal import Decimal
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
@@ -131,6 +135,27 @@ class GameTests(APITestCase):
         self.assertEqual(reports_resp.data["win_history"][0]["lulu_cut_amount"], "0.15")
         self.assertEqual(reports_resp.data["win_history"][0]["shop_net_cut_amount"], "0.85")
 
+    def test_game_reports_skip_draw_columns(self):
+        headers = self.auth_headers()
+        payload = {
+            "bet_amount": "10.00",
+            "num_players": 1,
+            "win_amount": "50.00",
+            "cartella_numbers": [[1, 2, 3]],
+        }
+        self.client.post(reverse("games"), payload, format="json", **headers)
+        self.client.post(reverse("games"), payload, format="json", **headers)
+
+        with CaptureQueriesContext(connection) as queries:
+            reports_resp = self.client.get(reverse("game-reports"), **headers)
+
+        self.assertEqual(reports_resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(reports_resp.data["game_history"]), 2)
+        game_selects = [q["sql"] for q in queries if 'FROM "games_game"' in q["sql"]]
+        self.assertEqual(len(game_selects), 1)
+        self.assertNotIn("draw_sequence", game_selects[0])
+        self.assertNotIn("shop_players_data", game_selects[0])
+
     def test_cancel_game_refunds_bet(self):
         headers = self.auth_headers()
         payload = {
@@ -891,3 +916,133 @@ class GameTests(APITestCase):
         self.assertEqual(str(session.total_payable), "80.00")
         self.assertIn(3, session.locked_cartellas)
         self.assertIn(4, session.locked_cartellas)
+
+    def test_admin_mark_active_updates_in_one_query(self):
+        from datetime import timedelta
+        from unittest.mock import MagicMock
+
+        from django.contrib.admin.sites import AdminSite
+        from django.utils import timezone
+
+        from .admin import GameAdmin
+
+        started = timezone.now() - timedelta(hours=1)
+        common = {"shop": self.shop, "bet_amount": "10.00", "num_players": 1, "win_amount": "10.00"}
+        pending = Game.objects.create(**common)
+        resumed = Game.objects.create(**common, status=Game.Status.CANCELLED, started_at=started)
+        Game.objects.create(**common, status=Game.Status.ACTIVE)
+
+        model_admin = GameAdmin(Game, AdminSite())
+        model_admin.message_user = MagicMock()
+        with self.assertNumQueries(1):
+            model_admin.mark_active(None, Game.objects.all())
+
+        model_admin.message_user.assert_called_once_with(None, "Marked 2 game(s) active.")
+        pending.refresh_from_db()
+        resumed.refresh_from_db()
+        self.assertEqual(pending.status, Game.Status.ACTIVE)
+        self.assertIsNotNone(pending.started_at)
+        self.assertEqual(resumed.started_at, started)
+
+    def test_admin_changelist_counts_cartellas_without_loading_json(self):
+        admin_user = ShopUser.objects.create_superuser(username="hq", password="pass1234")
+        self.client.force_login(admin_user)
+        Game.objects.create(
+            shop=self.shop,
+            bet_amount="10.00",
+            num_players=2,
+            win_amount="20.00",
+            cartella_numbers=[[1, 2, 3], [4, 5, 6]],
+        )
+
+        resp = self.client.get(reverse("admin:games_game_changelist"))
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        game = resp.context["cl"].result_list[0]
+        self.assertEqual(game.cartella_total, 2)
+        self.assertIn("cartella_numbers", game.get_deferred_fields())
+
+    def test_game_code_skips_taken_candidates_with_one_lookup(self):
+        from unittest.mock import patch
+
+        from .models import _CODE_CANDIDATES
+
+        base = self.shop.shop_code
+        common = {"shop": self.shop, "bet_amount": "10.00", "num_players": 1, "win_amount": "10.00"}
+        Game.objects.create(game_code=f"{base}-1000", **common)
+
+        suffixes = list(range(1000, 1000 + _CODE_CANDIDATES))
+        game = Game(**common)
+        with patch("games.models.random.sample", return_value=suffixes):
+            with self.assertNumQueries(1):
+                game._ensure_game_code()
+        self.assertEqual(game.game_code, f"{base}-1001")
+
+    def test_complete_serializer_rejects_game_finalized_concurrently(self):
+        from rest_framework.exceptions import ValidationError
+
+        from .serializers import GameCompleteSerializer
+
+        game = Game.objects.create(
+            shop=self.shop,
+            bet_amount=Decimal("10.00"),
+            num_players=1,
+            win_amount=Decimal("10.00"),
+            cartella_numbers=[list(range(1, 26))],
+            status=Game.Status.ACTIVE,
+        )
+        serializer = GameCompleteSerializer(game, data={"status": "completed", "winners": [0]})
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+
+        Game.objects.filter(pk=game.pk).update(status=Game.Status.CANCELLED)
+        with self.assertRaises(ValidationError):
+            serializer.save()
+
+        self.assertFalse(Transaction.objects.filter(reference=f"game:{game.game_code}:lulu_cut").exists())
+        self.assertEqual(Game.objects.get(pk=game.pk).status, Game.Status.CANCELLED)
+
+    def test_slug_game_code_insert_runs_without_savepoint(self):
+        game = Game(shop=self.shop, bet_amount="10.00", num_players=1, win_amount="10.00")
+        # Candidate lookup plus the INSERT.
+        with self.assertNumQueries(2):
+            game.save()
+
+    def test_session_id_collision_retries_with_fresh_code(self):
+        from unittest.mock import patch
+
+        ShopBingoSession.objects.create(shop=self.shop, session_id="SHOP-TAKEN1")
+
+        with patch("games.models._random_code", side_effect=["SHOP-TAKEN1", "SHOP-FRESH1"]):
+            session = ShopBingoSession.objects.create(shop=self.shop)
+
+        self.assertEqual(session.session_id, "SHOP-FRESH1")
+        self.assertEqual(ShopBingoSession.objects.filter(shop=self.shop).count(), 2)
+
+    def test_claim_serializer_reports_bingo_and_missing_numbers(self):
+        from .serializers import GameClaimSerializer
+
+        board = list(range(1, 26))
+        game = Game.objects.create(
+            shop=self.shop,
+            bet_amount="10.00",
+            num_players=1,
+            win_amount="10.00",
+            cartella_numbers=[board],
+            status=Game.Status.ACTIVE,
+        )
+        winning = [number for index, number in enumerate(board) if index != 12]
+
+        serializer = GameClaimSerializer(
+            data={"cartella_index": 0, "called_numbers": winning}, context={"game": game}
+        )
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertTrue(serializer.validated_data["is_bingo"])
+        self.assertEqual(serializer.validated_data["matched_count"], 24)
+
+        serializer = GameClaimSerializer(
+            data={"cartella_index": 0, "called_numbers": winning[2:] + [75]}, context={"game": game}
+        )
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertFalse(serializer.validated_data["is_bingo"])
+        self.assertEqual(serializer.validated_data["missing_numbers"], [1, 2])
+        self.assertEqual(serializer.validated_data["matched_count"], 22)
+        self.assertEqual(serializer.validated_data["required_count"], 24)
@@ -1,4 +1,5 @@
 from decimal import Decimal, ROUND_HALF_UP
+import logging
 import random
 from datetime import datetime, timedelta
 import math
@@ -18,7 +19,7 @@ from transactions.services import apply_transaction
 
 from .bonus import settle_bonus_for_completed_game
 from .offline_cartellas import get_offline_cartella_board
-from .models import Game, ShopBingoSession
+from .models import Game, ShopBingoSession, shuffled_draw_sequence, shuffled_draw_sequences
 from .serializers import (
     DetailResponseSerializer,
     GameAuditReportResponseSerializer,
@@ -27,6 +28,7 @@ from .serializers import (
     GameClaimSerializer,
     GameCompleteSerializer,
     GameCreateSerializer,
+    GameHistorySerializer,
     GameNextCallResponseSerializer,
     GamePauseResponseSerializer,
     GamePauseSerializer,
@@ -43,6 +45,8 @@ from .serializers import (
     ShopBingoSessionSerializer,
 )
 
+logger = logging.getLogger(__name__)
+
 
 ALLOWED_GAME_STATUS_FILTERS = {choice[0] for choice in Game.Status.choices}
 ALLOWED_TX_TYPE_FILTERS = {choice[0] for choice in Transaction.Type.choices}
@@ -114,9 +118,7 @@ def _get_or_create_public_cartella_draw_sequence(
     changed = False
 
     if len(sequences) < target_len:
-        sequences.extend(
-            [random.sample(range(1, 76), 75) for _ in range(target_len - len(sequences))]
-        )
+        sequences.extend(shuffled_draw_sequences(target_len - len(sequences)))
         changed = True
 
     if cartella_index < 0 or cartella_index >= len(sequences):
@@ -127,7 +129,7 @@ def _get_or_create_public_cartella_draw_sequence(
 
     sequence = sequences[cartella_index]
     if not isinstance(sequence, (list, tuple)) or len(sequence) != 75:
-        sequences[cartella_index] = random.sample(range(1, 76), 75)
+        sequences[cartella_index] = shuffled_draw_sequence()
         changed = True
         sequence = sequences[cartella_index]
 
@@ -325,9 +327,7 @@ _PATTERN_HUMAN_LABEL: dict[str, str] = {
 
 def _ensure_cartella_statuses(game: Game) -> dict[str, str]:
     total_cartellas = len(game.cartella_numbers or [])
-    statuses: dict[str, str] = {
-        str(index): "active" for index in range(total_cartellas)
-    }
+    statuses: dict[str, str] = dict.fromkeys(map(str, range(total_cartellas)), "active")
 
     if isinstance(game.cartella_statuses, dict):
         for key, value in game.cartella_statuses.items():
@@ -425,23 +425,7 @@ def _finalize_shop_session(session: ShopBingoSession) -> Game:
 
     session.shop.refresh_from_db(fields=["wallet_balance", "shop_cut_percentage", "lulu_cut_percentage"])
 
-    cut_percentage_raw = getattr(session.shop, "shop_cut_percentage", Decimal("10"))
-    lulu_cut_percentage_raw = getattr(session.shop, "lulu_cut_percentage", Decimal("15"))
-
-    try:
-        cut_percentage = Decimal(str(cut_percentage_raw if cut_percentage_raw is not None else 10))
-    except Exception:
-        cut_percentage = Decimal("10")
-
-    try:
-        lulu_cut_percentage = Decimal(
-            str(lulu_cut_percentage_raw if lulu_cut_percentage_raw is not None else 15)
-        )
-    except Exception:
-        lulu_cut_percentage = Decimal("15")
-
-    cut_percentage = max(Decimal("0"), min(Decimal("100"), cut_percentage))
-    lulu_cut_percentage = max(Decimal("0"), min(Decimal("100"), lulu_cut_percentage))
+    cut_percentage, lulu_cut_percentage = session.shop.cut_percentages()
     win_percentage = Decimal("100") - cut_percentage
     total_pool = session.total_payable
     if total_pool <= 0:
@@ -487,7 +471,7 @@ def _finalize_shop_session(session: ShopBingoSession) -> Game:
             current_called_number=None,
             started_at=None,
             banned_cartellas=[],
-            cartella_statuses={str(index): "active" for index in range(len(cartella_boards))},
+            cartella_statuses=dict.fromkeys(map(str, range(len(cartella_boards))), "active"),
             awarded_claims=[],
             winning_pattern="",
         )
@@ -532,7 +516,11 @@ class GameDrawView(APIView):
 
     @extend_schema(responses={200: GameSerializer}, tags=["Games"])
     def get(self, request, code: str):
-        game = get_object_or_404(Game, game_code=code, shop=request.user)
+        game = get_object_or_404(
+            Game.objects.only("game_code", "draw_sequence", "cartella_draw_sequences"),
+            game_code=code,
+            shop=request.user,
+        )
         data = {
             "game_code": game.game_code,
             "draw_sequence": game.draw_sequence,
@@ -620,7 +608,7 @@ class GameShuffleView(APIView):
         # Get board configuration from request if provided
         board_config = request.data.get("board_configuration")
         
-        game.draw_sequence = random.sample(range(1, 76), 75)
+        game.draw_sequence = shuffled_draw_sequence()
         game.called_numbers = []
         game.call_cursor = 0
         game.current_called_number = None
@@ -1007,9 +995,6 @@ class GameClaimView(APIView):
                 # We should strictly use the original generated cartella board.
                 board = original_board
                 
-                import logging
-                logger = logging.getLogger(__name__)
-
                 # The backend is the sole authority on whether a cartella has won.
                 # The client's requested `pattern` is treated as a hint only — if
                 # the board matches ANY winning pattern, the claim is honoured.
@@ -1226,10 +1211,7 @@ class GameClaimView(APIView):
                     status=status.HTTP_200_OK,
                 )
         except Exception as e:
-            import traceback
-            import logging
-            logger = logging.getLogger(__name__)
-            logger.error(f"GameClaimView error: {str(e)}\n{traceback.format_exc()}")
+            logger.exception("GameClaimView error: %s", e)
             return Response(
                 {"detail": f"Internal server error during claim validation: {str(e)}"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -1672,22 +1654,24 @@ class GameAddPlayerView(APIView):
                     status=status.HTTP_400_BAD_REQUEST,
                 )
 
-            taken_cartellas: set[int] = set()
-            if isinstance(game.cartella_number_map, dict):
-                for raw_number in game.cartella_number_map.keys():
-                    try:
-                        taken_cartellas.add(int(raw_number))
-                    except (TypeError, ValueError):
-                        continue
-
-            for player in players:
-                for raw_number in player.get("cartella_numbers", []) or []:
-                    try:
-                        taken_cartellas.add(int(raw_number))
-                    except (TypeError, ValueError):
-                        continue
+            # The number map is keyed by str(cartella number), so requested
+            # numbers are checked against it directly instead of re-parsing
+            # every key; player records only need scanning for the rest.
+            requested_cartellas = set(cartella_numbers)
+            cartella_map = game.cartella_number_map if isinstance(game.cartella_number_map, dict) else {}
+            duplicates = {number for number in requested_cartellas if str(number) in cartella_map}
+            unmatched = requested_cartellas - duplicates
+            if unmatched:
+                for player in players:
+                    for raw_number in player.get("cartella_numbers", []) or []:
+                        try:
+                            number = int(raw_number)
+                        except (TypeError, ValueError):
+                            continue
+                        if number in unmatched:
+                            duplicates.add(number)
 
-            duplicate_set = sorted(set(cartella_numbers).intersection(taken_cartellas))
+            duplicate_set = sorted(duplicates)
             if duplicate_set:
                 return Response(
                     {"detail": f"Cartellas already taken: {duplicate_set}"},
@@ -1718,15 +1702,10 @@ class GameAddPlayerView(APIView):
             existing_draw_sequences = list(game.cartella_draw_sequences or [])
             if len(existing_draw_sequences) < existing_cartella_count:
                 existing_draw_sequences.extend(
-                    [
-                        random.sample(range(1, 76), 75)
-                        for _ in range(existing_cartella_count - len(existing_draw_sequences))
-                    ]
+                    shuffled_draw_sequences(existing_cartella_count - len(existing_draw_sequences))
                 )
 
-            new_draw_sequences = [
-                random.sample(range(1, 76), 75) for _ in cartella_numbers
-            ]
+            new_draw_sequences = shuffled_draw_sequences(len(cartella_numbers))
 
             existing_cartella_boards.extend(new_cartella_boards)
             existing_draw_sequences.extend(new_draw_sequences)
@@ -1820,10 +1799,11 @@ class BasePublicGameCartellaView(APIView):
     rate_limit_window_seconds = 60
 
     def _get_client_ip(self, request) -> str:
-        x_forwarded_for = request.META.get("HTTP_X_FORWARDED_FOR")
+        meta = request.META
+        x_forwarded_for = meta.get("HTTP_X_FORWARDED_FOR")
         if x_forwarded_for:
-            return x_forwarded_for.split(",")[0].strip()
-        return request.META.get("REMOTE_ADDR", "unknown")
+            return x_forwarded_for.partition(",")[0].strip()
+        return meta.get("REMOTE_ADDR", "unknown")
 
     def _enforce_rate_limit(self, request):
         client_ip = self._get_client_ip(request)
@@ -2044,14 +2024,33 @@ class GameAuditReportView(APIView):
         if end_dt:
             games = games.filter(created_at__lte=end_dt)
 
-        games = games.order_by("-created_at")
+        # Draw orders, player data and claims are never read here; only load
+        # what GameHistorySerializer needs (plus the cartella fields behind
+        # assigned_cartella_numbers).
+        games = games.order_by("-created_at").only(
+            "game_code",
+            "num_players",
+            "cartella_numbers",
+            "cartella_number_map",
+            "status",
+            "winners",
+            "banned_cartellas",
+            "total_pool",
+            "payout_amount",
+            "shop_cut_amount",
+            "lulu_cut_amount",
+            "shop_net_cut_amount",
+            "winning_pattern",
+            "created_at",
+            "ended_at",
+        )
 
         game_history = []
         win_history = []
         banned_list = []
 
         for game in games.iterator(chunk_size=200):
-            game_data = GameSerializer(game).data
+            game_data = GameHistorySerializer(game).data
             winner_indexes = game_data.get("winners") or []
             assigned_numbers = game_data.get("assigned_cartella_numbers") or []
             winner_labels = []
@@ -0,0 +1,36 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is listed in requirements.txt
+    orjson = None
+
+
+# Datetimes are passed through to DRF's encoder so timestamps keep the exact
+# format the stdlib renderer produced (millisecond precision, ``Z`` suffix).
+_ORJSON_OPTIONS = (
+    (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS) if orjson is not None else 0
+)
+_drf_default = JSONEncoder().default
+
+
+class ORJSONRenderer(JSONRenderer):
+    """JSONRenderer that encodes compact responses with orjson.
+
+    Pretty-printed output (``?indent=`` / browsable API) and anything orjson
+    refuses to encode fall back to the stdlib implementation.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or not self.compact or self.ensure_ascii:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=_drf_default, option=_ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Same JavaScript-subset escaping as JSONRenderer.
+        return ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
@@ -1,5 +1,6 @@
 import os
 import sys
+from importlib.util import find_spec
 from pathlib import Path
 from urllib.parse import urlparse, parse_qsl
 from dotenv import load_dotenv
@@ -174,6 +175,10 @@ if database_url:
             'HOST': parsed.hostname,
             'PORT': parsed.port or default_port,
             'OPTIONS': dict(parse_qsl(parsed.query)),
+            # Keep connections open between requests instead of paying the
+            # TCP/TLS/auth handshake on every login; 0 restores per-request.
+            'CONN_MAX_AGE': int(get_env("DB_CONN_MAX_AGE", "600") or "0"),
+            'CONN_HEALTH_CHECKS': True,
         }
     }
 
@@ -192,6 +197,17 @@ else:
 # Password validation
 # --------------------------------------------------
 
+# Argon2id is cheaper per login than PBKDF2 at Django's iteration count.
+# Existing PBKDF2 hashes are upgraded on the next successful login; without
+# argon2-cffi installed the Django default order is kept.
+PASSWORD_HASHERS = [
+    *(["django.contrib.auth.hashers.Argon2PasswordHasher"] if find_spec("argon2") else []),
+    "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+    "django.contrib.auth.hashers.ScryptPasswordHasher",
+]
+
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},
     {"NAME": "django.contrib.auth.password_validation.MinimumLengthValidator"},
@@ -223,11 +239,15 @@ STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.TokenAuthentication",
+        "accounts.authentication.ShopTokenAuthentication",
     ],
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
+    "DEFAULT_RENDERER_CLASSES": [
+        "lulu_bingo.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
 }
 
@@ -260,6 +280,10 @@ EMAIL_TIMEOUT = int(get_env("EMAIL_TIMEOUT", "10") or "10")
 EMAIL_FAIL_SILENTLY = str_to_bool(get_env("EMAIL_FAIL_SILENTLY"), True)
 EMAIL_RAISE_EXCEPTIONS = str_to_bool(get_env("EMAIL_RAISE_EXCEPTIONS"), False)
 EMAIL_SEND_ASYNC = str_to_bool(get_env("EMAIL_SEND_ASYNC"), False)
+# The background email sender retries failed deliveries this many times,
+# DELAY seconds apart, without blocking other queued mail.
+EMAIL_ASYNC_MAX_RETRIES = int(get_env("EMAIL_ASYNC_MAX_RETRIES", "3") or "0")
+EMAIL_ASYNC_RETRY_DELAY = float(get_env("EMAIL_ASYNC_RETRY_DELAY", "30") or "0")
 
 EMAIL_BACKEND = get_env(
     "EMAIL_BACKEND",
@@ -279,6 +303,22 @@ APP_BASE_URL = get_env("APP_BASE_URL", "http://localhost:5173") or "http://local
 
 AUTH_USER_MODEL = "accounts.ShopUser"
 
+# Failed logins are buffered and bulk-inserted once this many are pending
+# (or after LOGIN_ATTEMPT_FLUSH_SECONDS). 0 or 1 writes each attempt directly.
+# With LOGIN_ATTEMPT_ASYNC_FLUSH the insert runs on a background writer thread
+# instead of the request that filled the buffer.
+LOGIN_ATTEMPT_BUFFER_SIZE = int(get_env("LOGIN_ATTEMPT_BUFFER_SIZE", "0") or "0")
+LOGIN_ATTEMPT_FLUSH_SECONDS = float(get_env("LOGIN_ATTEMPT_FLUSH_SECONDS", "5") or "5")
+LOGIN_ATTEMPT_ASYNC_FLUSH = str_to_bool(get_env("LOGIN_ATTEMPT_ASYNC_FLUSH"), True)
+
+# Failed logins per (client IP, username) allowed within the window before
+# LoginView answers 429 without hashing or touching the database. 0 disables.
+# Counters live in the default cache, which is per-process LocMemCache unless
+# CACHES is configured: each gunicorn worker then keeps its own count and a
+# restart resets it. Only enable this with a shared cache backend.
+LOGIN_RATE_LIMIT = int(get_env("LOGIN_RATE_LIMIT", "0") or "0")
+LOGIN_RATE_LIMIT_WINDOW_SECONDS = int(get_env("LOGIN_RATE_LIMIT_WINDOW_SECONDS", "300") or "300")
+
 # --------------------------------------------------
 # Defaults
 # --------------------------------------------------